@@ -1,12 +1,60 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import re
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
 
 import anthropic
+import httpx
+import orjson
+from concurrency import run_blocking
+from llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# Process-wide clients keyed by API key, so every AIGenerator (and every
+# hot-reload of one) shares a single warm connection pool
+_CLIENT_CACHE: Dict[str, anthropic.AsyncAnthropic] = {}
+
+
+def _get_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Return the shared Anthropic client for an API key, creating it once"""
+    client = _CLIENT_CACHE.get(api_key)
+    if client is None:
+        client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)
+            ),
+        )
+        _CLIENT_CACHE[api_key] = client
+    return client
+
+
+class ToolResult(NamedTuple):
+    """Outcome of one tool_use block, kept compact until it is sent"""
+
+    tool_use_id: str
+    content: str
+    is_error: bool = False
+
+    def to_block(self) -> Dict[str, Any]:
+        """Materialize the tool_result content block for the API"""
+        block = {
+            "type": "tool_result",
+            "tool_use_id": self.tool_use_id,
+            "content": self.content,
+        }
+        if self.is_error:
+            block["is_error"] = True
+        return block
 
 
 class AIGenerator:
     """Handles interactions with Anthropic's Claude API for generating responses"""
 
-    # Static system prompt to avoid rebuilding on each call
+    # Static system prompt to avoid rebuilding on each call. It is the
+    # prompt-cache prefix shared by every request: any edit here (even
+    # whitespace) invalidates cached prefixes until they are rewritten
     SYSTEM_PROMPT = """ You are an AI assistant specialized in course materials and educational content with access to tools for course information.
 
 Tool Usage:
@@ -46,14 +94,72 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
 
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    # Static system prompt block, marked as a prompt-cache breakpoint
+    SYSTEM_BLOCK = {
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }
+    STATIC_SYSTEM_CONTENT = [SYSTEM_BLOCK]
+    HISTORY_HEADER_BLOCK = {"type": "text", "text": "Previous conversation:"}
+
+    # Tool results that mean the lookup failed in a known way; a round made
+    # up only of these is answered with a fixed reply instead of another
+    # call. The raw results (which may hold exception text) are only logged
+    KNOWN_FAILURE_PREFIXES = ("Error executing tool:", "No course found matching")
+    NO_RESULTS_REPLY = "I couldn't find information on that in the course materials."
+
+    # Tool-calling rounds before Claude is made to answer in text
+    MAX_TOOL_ROUNDS = 2
+
+    # Queries that unambiguously ask for a course outline. Bare "lesson" and
+    # "structure" are left out since content questions often name a lesson
+    # or a data structure
+    OUTLINE_QUERY_PATTERN = re.compile(
+        r"\b(outline|syllabus)\b|\bcourse structure\b|\blist (all |the )*lessons\b",
+        re.IGNORECASE,
+    )
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        betas: Optional[List[str]] = None,
+        llm_cache: Optional[LLMCache] = None,
+    ):
+        self.client = _get_client(api_key)
         self.model = model
+        # Optional exact-match cache in front of messages.create
+        self.llm_cache = llm_cache
+
+        self.temperature = 0
+        self.max_tokens = 800
+
+        # Opt into beta features only when configured; unsupported beta flags
+        # are rejected by the API, so nothing is enabled by default
+        self.extra_headers = {"anthropic-beta": ",".join(betas)} if betas else None
+
+        # Tool definitions prepared once by register_tools
+        self._registered_tools: Optional[List[Dict]] = None
+        self._cached_tools: Optional[List[Dict]] = None
+        # (source list, prepared list) for the last unregistered tool list
+        self._adhoc_tools: tuple = (None, None)
 
-        # Pre-build base API parameters
-        self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
+    def register_tools(self, tools: List[Dict]):
+        """
+        Prepare a tool list once so requests can send it by reference.
+
+        The stored copy has sorted keys and a cache breakpoint on the last
+        tool, so every request sends byte-identical tool definitions. Pass
+        the same list object as `tools` to use it.
+        """
+        prepared = orjson.loads(orjson.dumps(tools, option=orjson.OPT_SORT_KEYS))
+        if prepared:
+            prepared[-1]["cache_control"] = {"type": "ephemeral"}
+        self._registered_tools = tools
+        self._cached_tools = prepared
 
-    def generate_response(
+    async def generate_response(
         self,
         query: str,
         conversation_history: Optional[str] = None,
@@ -76,59 +182,191 @@ Provide only the direct answer to what was asked.
         Returns:
             Generated response as string
         """
-
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
+        return "".join(
+            [
+                text
+                async for text in self._run_rounds(
+                    query, conversation_history, tools, tool_manager, stream=False
+                )
+            ]
         )
 
+    async def generate_response_stream(
+        self,
+        query: str,
+        conversation_history: Optional[str] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the AI response as text deltas, with the same tool rounds as
+        generate_response.
+
+        A round only turns out to be a tool round once its final message
+        arrives, so each tool-capable round's text is held back until then
+        and dropped if it was just a preamble to a tool call. Rounds that
+        can't call tools (no tools, or the forced final answer) are
+        streamed as Claude produces them.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+
+        Yields:
+            Response text chunks
+        """
+        async for text in self._run_rounds(
+            query, conversation_history, tools, tool_manager, stream=True
+        ):
+            yield text
+
+    async def _run_rounds(
+        self,
+        query: str,
+        conversation_history: Optional[str],
+        tools: Optional[List],
+        tool_manager,
+        stream: bool,
+    ) -> AsyncIterator[str]:
+        """
+        Run the tool rounds behind generate_response and
+        generate_response_stream, yielding the answer text.
+
+        Args:
+            stream: Make streaming calls instead of messages.create
+
+        Yields:
+            Answer text chunks (a single chunk per reply when not streaming)
+        """
+        system_content = self._build_system_content(conversation_history)
+
         # Initialize message history
         messages = [{"role": "user", "content": query}]
 
-        # Sequential tool calling loop (max 2 rounds)
-        MAX_ROUNDS = 2
-        for round_num in range(1, MAX_ROUNDS + 1):
-            # Make API call with tools
-            response = self._make_api_call(messages, tools, system_content)
-
-            # Termination: Natural completion (no tool use)
+        # Termination: no tool manager to run tools, so the first reply is
+        # the answer
+        if not tools or not tool_manager:
+            async for text in self._answer(messages, tools, system_content, stream):
+                yield text
+            return
+
+        # Round 1: outline queries go straight to the outline tool
+        tool_choice = self._route_tool_choice(query, tools, tool_manager)
+        for _ in range(self.MAX_TOOL_ROUNDS):
+            response, texts = await self._tool_round_call(
+                messages, tools, system_content, stream, tool_choice
+            )
+            tool_choice = None
+
+            # Termination: Natural completion
             if response.stop_reason != "tool_use":
-                return response.content[0].text
-
-            # Termination: No tool manager (shouldn't happen, but safe)
-            if not tool_manager:
-                return response.content[0].text
-
-            # Process tool round - updates messages in place
-            messages = self._process_tool_round(response, messages, tool_manager)
-
-            # Check if any tool had an error
-            if messages and messages[-1]["role"] == "user":
-                for result in messages[-1].get("content", []):
-                    if isinstance(result, dict) and result.get("is_error"):
-                        # Termination: Tool execution error
-                        # Make one final call to let Claude respond with error context
-                        final_response = self._make_api_call(
-                            messages, None, system_content
-                        )
-                        return final_response.content[0].text
-
-            # Termination: Max rounds reached
-            if round_num == MAX_ROUNDS:
-                # Force final response without tools
-                final_response = self._make_api_call(messages, None, system_content)
-                return final_response.content[0].text
-
-        # Should never reach here due to explicit max rounds check
-        return "Error: Unexpected flow termination"
-
-    def _make_api_call(
+                for text in texts:
+                    yield text
+                return
+
+            messages = await self._process_tool_round(response, messages, tool_manager)
+
+            # Termination: every tool failed in a known way - answer from the
+            # template rather than paying for another round-trip
+            failure_reply = self._known_failure_reply(messages)
+            if failure_reply is not None:
+                yield failure_reply
+                return
+
+            # A tool error skips further rounds so Claude answers with the
+            # error context
+            if self._has_tool_error(messages):
+                break
+
+        # Termination: tool error or max rounds reached. Force a text
+        # response; tools stay in the request so the cached [tools][system]
+        # prefix is still reused
+        async for text in self._answer(
+            messages, tools, system_content, stream, force_text=True
+        ):
+            yield text
+
+    async def _tool_round_call(
+        self,
+        messages: List[Dict],
+        tools: List,
+        system_content: List[Dict],
+        stream: bool,
+        tool_choice: Optional[Dict] = None,
+    ):
+        """
+        Make a call that may end in tool use.
+
+        Streamed text is collected rather than yielded, since it is only the
+        answer if the final message turns out not to be a tool call.
+
+        Returns:
+            Tuple of (final response, its text chunks)
+        """
+        if not stream:
+            response = await self._make_api_call(
+                messages, tools, system_content, tool_choice=tool_choice
+            )
+            return response, [self._response_text(response)]
+
+        params = self._build_api_params(
+            messages, tools, system_content, tool_choice=tool_choice
+        )
+        async with self.client.messages.stream(**params) as message_stream:
+            chunks = [text async for text in message_stream.text_stream]
+            return await message_stream.get_final_message(), chunks
+
+    async def _answer(
+        self,
+        messages: List[Dict],
+        tools: Optional[List],
+        system_content: List[Dict],
+        stream: bool,
+        force_text: bool = False,
+    ) -> AsyncIterator[str]:
+        """Yield the text of a call whose reply is the answer as-is"""
+        if not stream:
+            response = await self._make_api_call(
+                messages, tools, system_content, force_text=force_text
+            )
+            yield self._response_text(response)
+            return
+
+        params = self._build_api_params(
+            messages, tools, system_content, force_text=force_text
+        )
+        async with self.client.messages.stream(**params) as message_stream:
+            async for text in message_stream.text_stream:
+                yield text
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Join the text blocks of a messages.create response"""
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    def _build_system_content(self, conversation_history: Optional[str]) -> List[Dict]:
+        """Build system prompt blocks for a request"""
+        if not conversation_history:
+            # Shared by reference - nothing is allocated on this path
+            return self.STATIC_SYSTEM_CONTENT
+
+        # History changes every turn so it goes in its own uncached block
+        # after the static system prompt; only the history is allocated
+        return [
+            *self.STATIC_SYSTEM_CONTENT,
+            self.HISTORY_HEADER_BLOCK,
+            {"type": "text", "text": conversation_history},
+        ]
+
+    async def _make_api_call(
         self,
         messages: List[Dict],
         tools: Optional[List] = None,
-        system_content: str = "",
+        system_content: Optional[List[Dict]] = None,
+        force_text: bool = False,
+        tool_choice: Optional[Dict] = None,
     ):
         """
         Make API call to Claude with given messages and optional tools.
@@ -136,24 +374,91 @@ Provide only the direct answer to what was asked.
         Args:
             messages: Conversation message history
             tools: Optional tool definitions
-            system_content: System prompt content
+            system_content: System prompt content blocks
+            force_text: Disallow tool use while still sending tool definitions
+            tool_choice: Explicit tool_choice overriding auto/none
 
         Returns:
             Claude API response
         """
+        api_params = self._build_api_params(
+            messages, tools, system_content, force_text, tool_choice
+        )
+        if self.llm_cache is not None:
+            return await self.llm_cache.get_or_create(
+                api_params, self.client.messages.create
+            )
+        return await self.client.messages.create(**api_params)
+
+    def _build_api_params(
+        self,
+        messages: List[Dict],
+        tools: Optional[List] = None,
+        system_content: Optional[List[Dict]] = None,
+        force_text: bool = False,
+        tool_choice: Optional[Dict] = None,
+    ) -> Dict[str, Any]:
+        """Build keyword arguments shared by messages.create and messages.stream"""
         api_params = {
-            **self.base_params,
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
             "messages": messages,
-            "system": system_content,
+            "system": system_content or [],
         }
+        if self.extra_headers:
+            api_params["extra_headers"] = self.extra_headers
 
         if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+            api_params["tools"] = self._prepare_tools(tools)
+            api_params["tool_choice"] = tool_choice or {
+                "type": "none" if force_text else "auto"
+            }
+
+        return api_params
 
-        return self.client.messages.create(**api_params)
+    def _prepare_tools(self, tools: List[Dict]) -> List[Dict]:
+        """
+        Return the request form of a tool list.
 
-    def _process_tool_round(
+        Every round of a request sends the same list object, so unregistered
+        tool lists are prepared once and reused while the caller keeps
+        passing the same list.
+        """
+        if tools is self._registered_tools:
+            return self._cached_tools
+
+        source, prepared = self._adhoc_tools
+        if source is not tools:
+            # Mark the last tool as a cache breakpoint so the tool schemas
+            # are cached together with the static system prompt
+            prepared = [
+                *tools[:-1],
+                {**tools[-1], "cache_control": {"type": "ephemeral"}},
+            ]
+            self._adhoc_tools = (tools, prepared)
+        return prepared
+
+    def _route_tool_choice(
+        self, query: str, tools: Optional[List], tool_manager
+    ) -> Optional[Dict]:
+        """
+        Pick a tool up front when the query leaves no routing decision.
+
+        Returns:
+            tool_choice forcing get_course_outline for outline queries, or
+            None to let Claude decide. Nothing is forced without a tool
+            manager, as a forced tool call could never be answered
+        """
+        if not tools or not tool_manager:
+            return None
+        if not self.OUTLINE_QUERY_PATTERN.search(query):
+            return None
+        if not any(tool.get("name") == "get_course_outline" for tool in tools):
+            return None
+        return {"type": "tool", "name": "get_course_outline"}
+
+    async def _process_tool_round(
         self, response, messages: List[Dict], tool_manager
     ) -> List[Dict]:
         """
@@ -170,32 +475,101 @@ Provide only the direct answer to what was asked.
         # Add assistant's tool use response to messages
         messages.append({"role": "assistant", "content": response.content})
 
-        # Execute all tool calls
-        tool_results = []
-        for block in response.content:
-            if block.type == "tool_use":
-                try:
-                    result = tool_manager.execute_tool(block.name, **block.input)
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        }
-                    )
-                except Exception as e:
-                    # Handle tool execution errors gracefully
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": f"Error executing tool: {str(e)}",
-                            "is_error": True,
-                        }
-                    )
-
-        # Add tool results to messages
+        tool_results = await self._run_tools(response, tool_manager)
+
+        # Add tool results to messages, building the API dicts in one pass
         if tool_results:
-            messages.append({"role": "user", "content": tool_results})
+            messages.append(
+                {"role": "user", "content": [r.to_block() for r in tool_results]}
+            )
 
         return messages
+
+    async def _run_tools(self, response, tool_manager) -> List[ToolResult]:
+        """
+        Execute the tool_use blocks of a response.
+
+        Returns:
+            One ToolResult per tool_use block, in request order
+        """
+        # Execute all tool calls concurrently - each one is a blocking
+        # ChromaDB round-trip, so parallel calls overlap on the thread pool.
+        # Identical (name, input) calls within the round run only once.
+        tool_blocks = [block for block in response.content if block.type == "tool_use"]
+        call_keys = [
+            (block.name, orjson.dumps(block.input, option=orjson.OPT_SORT_KEYS))
+            for block in tool_blocks
+        ]
+        unique_calls = {key: block for key, block in zip(call_keys, tool_blocks)}
+        outcomes = await asyncio.gather(
+            *(
+                run_blocking(tool_manager.execute_tool, block.name, **block.input)
+                for block in unique_calls.values()
+            ),
+            return_exceptions=True,
+        )
+        memo = dict(zip(unique_calls, outcomes))
+
+        tool_results = []
+        for block, key in zip(tool_blocks, call_keys):
+            result = memo[key]
+            if isinstance(result, Exception):
+                # Handle tool execution errors gracefully
+                tool_results.append(
+                    ToolResult(block.id, f"Error executing tool: {str(result)}", True)
+                )
+            else:
+                tool_results.append(
+                    ToolResult(block.id, self._serialize_tool_result(result))
+                )
+        return tool_results
+
+    @staticmethod
+    def _last_tool_results(messages: List[Dict]) -> List[Dict]:
+        """Get the tool_result blocks _process_tool_round just appended"""
+        return [
+            block
+            for block in messages[-1].get("content", [])
+            if isinstance(block, dict) and block.get("type") == "tool_result"
+        ]
+
+    def _has_tool_error(self, messages: List[Dict]) -> bool:
+        """Check whether any tool in the last round raised an error"""
+        return any(
+            result.get("is_error") for result in self._last_tool_results(messages)
+        )
+
+    def _known_failure_reply(self, messages: List[Dict]) -> Optional[str]:
+        """
+        Return the fixed reply if every tool result in the last round failed
+        in a known way (tool exception or unknown course).
+
+        Returns:
+            Reply text, or None if Claude should see the results
+        """
+        results = self._last_tool_results(messages)
+        if not results or not all(
+            isinstance(result["content"], str)
+            and result["content"].startswith(self.KNOWN_FAILURE_PREFIXES)
+            for result in results
+        ):
+            return None
+
+        logger.warning(
+            "All tool calls failed: %s",
+            "; ".join(result["content"] for result in results),
+        )
+        return self.NO_RESULTS_REPLY
+
+    @staticmethod
+    def _serialize_tool_result(result: Any) -> str:
+        """
+        Render a tool result as tool_result content.
+
+        Structured results are dumped as compact JSON with sorted keys, so
+        the same data always produces the same bytes and later rounds can
+        reuse the cached prompt prefix.
+        """
+        if isinstance(result, str):
+            return result
+        return orjson.dumps(result, option=orjson.OPT_SORT_KEYS).decode()
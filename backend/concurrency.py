@@ -0,0 +1,17 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking work (ChromaDB queries, embeddings) so it stays
+# off the event loop without spawning unbounded threads under load
+_BLOCKING_EXECUTOR = ThreadPoolExecutor(
+    max_workers=32, thread_name_prefix="rag-blocking"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the shared bounded thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _BLOCKING_EXECUTOR, functools.partial(func, *args, **kwargs)
+    )
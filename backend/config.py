@@ -14,9 +14,21 @@ class Config:
     # Anthropic API settings
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    # Comma-separated anthropic-beta flags, e.g. latency-optimized inference
+    # where the model/region supports it (empty = none)
+    ANTHROPIC_BETAS: str = os.getenv("ANTHROPIC_BETAS", "")
 
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    # "torch", or "onnx" to run the model on ONNX Runtime (uv sync --extra
+    # onnx). EMBEDDING_MODEL_FILE picks a file inside the model repo,
+    # e.g. onnx/model_qint8_avx512_vnni.onnx for the INT8 quantized export.
+    # Embeddings differ slightly between exports; rebuild chroma_db after
+    # switching.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_MODEL_FILE: str = os.getenv("EMBEDDING_MODEL_FILE", "")
+    # "auto" uses CUDA when torch can see a GPU, else CPU; or name a device
+    EMBEDDING_DEVICE: str = os.getenv("RAG_EMBED_DEVICE", "auto")
 
     # Document processing settings
     CHUNK_SIZE: int = 800  # Size of text chunks for vector storage
@@ -24,6 +36,26 @@ class Config:
     MAX_RESULTS: int = 5  # Maximum search results to return
     MAX_HISTORY: int = 2  # Number of conversation messages to remember
 
+    # Response cache settings
+    RESPONSE_CACHE_SIZE: int = 512  # Cached answers to keep (0 disables caching)
+    RESPONSE_CACHE_THRESHOLD: float = 0.95  # Min query similarity for a cache hit
+
+    # Claude call cache settings (exact-match, temperature 0 calls only).
+    # Off by default: the response cache above already answers repeat
+    # questions, so this only helps when that cache is disabled
+    LLM_CACHE_SIZE: int = 0  # Cached API responses to keep (0 disables caching)
+    LLM_CACHE_TTL: float = 3600  # Seconds before a cached response expires
+
+    # Query embedding cache (repeated search queries skip the embedding model)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024  # Embeddings to keep (0 disables caching)
+
+    # Search result cache (near-duplicate queries skip the content collection)
+    SEARCH_CACHE_SIZE: int = 256  # Cached searches to keep (0 disables caching)
+    SEARCH_CACHE_THRESHOLD: float = 0.97  # Min query similarity for a cache hit
+
+    # Tool result memo (search and outline calls with identical arguments)
+    TOOL_CACHE_SIZE: int = 1024  # Cached tool results to keep (0 disables caching)
+
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
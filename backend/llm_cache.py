@@ -0,0 +1,121 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Protocol
+
+import orjson
+from pydantic import BaseModel
+
+
+class CacheBackend(Protocol):
+    """Storage interface for LLMCache"""
+
+    async def get(self, key: str) -> Optional[Any]: ...
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None): ...
+
+    async def delete(self, key: str): ...
+
+
+class InMemoryCacheBackend:
+    """Bounded LRU backend with optional per-entry expiry"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        # key -> (expiry timestamp or None, value)
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        # Evict least recently used entries once over capacity
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _sort_keys(value: Any) -> Any:
+    """Recursively rebuild dicts with sorted keys"""
+    if isinstance(value, dict):
+        return {key: _sort_keys(value[key]) for key in sorted(value)}
+    if isinstance(value, list):
+        return [_sort_keys(item) for item in value]
+    return value
+
+
+def _serialize_block(obj: Any) -> Any:
+    """orjson fallback for SDK content blocks replayed in message history"""
+    if isinstance(obj, BaseModel):
+        # Sorted here too: OPT_SORT_KEYS isn't guaranteed to reach dicts
+        # returned from default, and equal blocks must hash the same
+        return _sort_keys(obj.model_dump())
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+class LLMCache:
+    """Exact-match cache for deterministic (temperature 0) Claude calls"""
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> Optional[str]:
+        """
+        Hash request parameters into a cache key.
+
+        Tool schemas are static, so only their names are part of the key.
+
+        Returns:
+            Hex digest, or None if the request should not be cached
+        """
+        if params.get("temperature") != 0:
+            return None
+
+        keyed = {**params, "tools": [tool["name"] for tool in params.get("tools", [])]}
+        try:
+            payload = orjson.dumps(
+                keyed, default=_serialize_block, option=orjson.OPT_SORT_KEYS
+            )
+        except TypeError:
+            return None
+        return hashlib.sha256(payload).hexdigest()
+
+    async def get_or_create(
+        self, params: Dict[str, Any], create: Callable[..., Awaitable[Any]]
+    ) -> Any:
+        """Return the cached response for params, calling create(**params) on a miss"""
+        key = self.make_key(params)
+        if key is None:
+            return await create(**params)
+
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        response = await create(**params)
+        await self.backend.set(key, response, self.ttl)
+        return response
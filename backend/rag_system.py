@@ -1,14 +1,28 @@
 import os
-from typing import Dict, List, Optional, Tuple
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from ai_generator import AIGenerator
+from concurrency import run_blocking
 from document_processor import DocumentProcessor
+from llm_cache import InMemoryCacheBackend, LLMCache
 from models import Course, CourseChunk, Lesson
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
+from semantic_cache import SemanticCache
 from session_manager import SessionManager
 from vector_store import VectorStore
 
 
+def _query_entities(query: str) -> Tuple[str, ...]:
+    """Numbers and capitalized words (after the first) of a query, lowercased"""
+    words = re.findall(r"\w+", query)
+    return tuple(
+        word.lower()
+        for i, word in enumerate(words)
+        if word.isdigit() or (i and word[0].isupper())
+    )
+
+
 class RAGSystem:
     """Main orchestrator for the Retrieval-Augmented Generation system"""
 
@@ -20,19 +34,49 @@ class RAGSystem:
             config.CHUNK_SIZE, config.CHUNK_OVERLAP
         )
         self.vector_store = VectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
+            config.CHROMA_PATH,
+            config.EMBEDDING_MODEL,
+            config.MAX_RESULTS,
+            embedding_backend=config.EMBEDDING_BACKEND,
+            embedding_model_file=config.EMBEDDING_MODEL_FILE or None,
+            embedding_device=config.EMBEDDING_DEVICE,
+            query_cache_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+            search_cache_size=config.SEARCH_CACHE_SIZE,
+            search_cache_threshold=config.SEARCH_CACHE_THRESHOLD,
         )
         self.ai_generator = AIGenerator(
-            config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL
+            config.ANTHROPIC_API_KEY,
+            config.ANTHROPIC_MODEL,
+            betas=[b.strip() for b in config.ANTHROPIC_BETAS.split(",") if b.strip()],
+            llm_cache=(
+                LLMCache(
+                    InMemoryCacheBackend(config.LLM_CACHE_SIZE),
+                    ttl=config.LLM_CACHE_TTL,
+                )
+                if config.LLM_CACHE_SIZE > 0
+                else None
+            ),
         )
         self.session_manager = SessionManager(config.MAX_HISTORY)
 
+        # Cache of (answer, sources) for repeated questions
+        self.response_cache = (
+            SemanticCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_THRESHOLD)
+            if config.RESPONSE_CACHE_SIZE > 0
+            else None
+        )
+
         # Initialize search tools
-        self.tool_manager = ToolManager()
+        self.tool_manager = ToolManager(config.TOOL_CACHE_SIZE)
         self.search_tool = CourseSearchTool(self.vector_store)
         self.outline_tool = CourseOutlineTool(self.vector_store)
-        self.tool_manager.register_tool(self.search_tool)
-        self.tool_manager.register_tool(self.outline_tool)
+        # Both tools only read the vector store
+        self.tool_manager.register_tool(self.search_tool, cacheable=True)
+        self.tool_manager.register_tool(self.outline_tool, cacheable=True)
+
+        # Tool definitions don't change at runtime; build and prepare them once
+        self.tool_definitions = self.tool_manager.get_tool_definitions()
+        self.ai_generator.register_tools(self.tool_definitions)
 
     def add_course_document(self, file_path: str) -> Tuple[Course, int]:
         """
@@ -56,6 +100,9 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
 
+            # Cached answers may be stale once the knowledge base changes
+            self._clear_response_cache()
+
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
@@ -117,9 +164,18 @@ class RAGSystem:
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
 
+        if total_courses or clear_existing:
+            self._clear_response_cache()
+
         return total_courses, total_chunks
 
-    def query(
+    def _clear_response_cache(self):
+        """Drop cached answers and tool results after the knowledge base changes"""
+        if self.response_cache is not None:
+            self.response_cache.clear()
+        self.tool_manager.clear_result_cache()
+
+    async def query(
         self, query: str, session_id: Optional[str] = None
     ) -> Tuple[str, List[str]]:
         """
@@ -140,19 +196,27 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
 
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
-            query=prompt,
-            conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager,
-        )
+        # Serve near-duplicate questions from the semantic cache
+        cache_key, cached = await self._lookup_cached_response(query, history)
+
+        if cached is not None:
+            response, sources = cached
+        else:
+            # Collect this query's sources apart from concurrent queries
+            tools = self.tool_manager.session()
+
+            # Generate response using AI with tools
+            response = await self.ai_generator.generate_response(
+                query=prompt,
+                conversation_history=history,
+                tools=self.tool_definitions,
+                tool_manager=tools,
+            )
 
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
+            # Get sources from the searches this query ran
+            sources = tools.get_sources()
 
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+            self._store_cached_response(cache_key, response, sources)
 
         # Update conversation history
         if session_id:
@@ -161,6 +225,82 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
 
+    async def query_stream(
+        self, query: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query, streaming the response as it is generated.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Yields:
+            {"type": "text", "text": ...} events for each response chunk,
+            then a single {"type": "sources", "sources": [...]} event
+        """
+        prompt = f"""Answer this question about course materials: {query}"""
+
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+
+        cache_key, cached = await self._lookup_cached_response(query, history)
+
+        if cached is not None:
+            response, sources = cached
+            yield {"type": "text", "text": response}
+        else:
+            tools = self.tool_manager.session()
+            chunks = []
+            async for text in self.ai_generator.generate_response_stream(
+                query=prompt,
+                conversation_history=history,
+                tools=self.tool_definitions,
+                tool_manager=tools,
+            ):
+                chunks.append(text)
+                yield {"type": "text", "text": text}
+            response = "".join(chunks)
+
+            sources = tools.get_sources()
+
+            self._store_cached_response(cache_key, response, sources)
+
+        if session_id:
+            self.session_manager.add_exchange(session_id, query, response)
+
+        yield {"type": "sources", "sources": sources}
+
+    async def _lookup_cached_response(self, query: str, history: Optional[str]):
+        """
+        Look up a cached answer for a query.
+
+        Entries are scoped to the conversation history so follow-ups can't
+        match answers given in a different context, and to the query's
+        numbers and names: "lesson 1" and "lesson 2" embed almost
+        identically but need different answers.
+
+        Returns:
+            Tuple of (cache key for storing a fresh answer, cached
+            (response, sources) or None)
+        """
+        if self.response_cache is None:
+            return None, None
+
+        cache_key = (
+            (SemanticCache.context_key(history), _query_entities(query)),
+            # Embedding the query is CPU-bound - keep it off the event loop.
+            # embed_query shares its LRU cache with the search tool
+            await run_blocking(self.vector_store.embed_query, query),
+        )
+        return cache_key, self.response_cache.get(*cache_key)
+
+    def _store_cached_response(self, cache_key, response: str, sources: List):
+        """Cache a generated answer under the key from _lookup_cached_response"""
+        if self.response_cache is not None:
+            self.response_cache.put(*cache_key, (response, sources))
+
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
         return {
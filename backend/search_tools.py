@@ -1,6 +1,9 @@
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Protocol
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Tuple
 
+import orjson
 from vector_store import SearchResults, VectorStore
 
 
@@ -17,38 +20,44 @@ class Tool(ABC):
         """Execute the tool with given parameters"""
         pass
 
+    def execute_with_sources(self, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute the tool, also returning the sources behind its result"""
+        return self.execute(**kwargs), []
+
 
 class CourseSearchTool(Tool):
     """Tool for searching course content with semantic course name matching"""
 
+    # Built once and shared; callers must not mutate it
+    TOOL_DEFINITION: Dict[str, Any] = {
+        "name": "search_course_content",
+        "description": "Search course materials with smart course name matching and lesson filtering",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What to search for in the course content",
+                },
+                "course_name": {
+                    "type": "string",
+                    "description": "Course title (partial matches work, e.g. 'MCP', 'Introduction')",
+                },
+                "lesson_number": {
+                    "type": "integer",
+                    "description": "Specific lesson number to search within (e.g. 1, 2, 3)",
+                },
+            },
+            "required": ["query"],
+        },
+    }
+
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
 
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
-        return {
-            "name": "search_course_content",
-            "description": "Search course materials with smart course name matching and lesson filtering",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "What to search for in the course content",
-                    },
-                    "course_name": {
-                        "type": "string",
-                        "description": "Course title (partial matches work, e.g. 'MCP', 'Introduction')",
-                    },
-                    "lesson_number": {
-                        "type": "integer",
-                        "description": "Specific lesson number to search within (e.g. 1, 2, 3)",
-                    },
-                },
-                "required": ["query"],
-            },
-        }
+        return self.TOOL_DEFINITION
 
     def execute(
         self,
@@ -67,6 +76,23 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        return self.execute_with_sources(query, course_name, lesson_number)[0]
+
+    def execute_with_sources(
+        self,
+        query: str,
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Execute the search, returning the sources alongside the results.
+
+        Sources are returned rather than stored on the tool so concurrent
+        searches can't overwrite each other's.
+
+        Returns:
+            Tuple of (formatted results or error message, sources for the UI)
+        """
 
         # Use the vector store's unified search interface
         results = self.store.search(
@@ -75,7 +101,7 @@ class CourseSearchTool(Tool):
 
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
 
         # Handle empty results
         if results.is_empty():
@@ -84,12 +110,14 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
 
         # Format and return results
         return self._format_results(results)
 
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(
+        self, results: SearchResults
+    ) -> Tuple[str, List[Dict[str, Any]]]:
         """Format search results with course and lesson context"""
         formatted = []
         sources = []  # Track sources for the UI with links
@@ -119,34 +147,34 @@ class CourseSearchTool(Tool):
 
             formatted.append(f"{header}\n{doc}")
 
-        # Store sources for retrieval
-        self.last_sources = sources
-
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 
 class CourseOutlineTool(Tool):
     """Tool for retrieving complete course outlines with lesson information"""
 
+    # Built once and shared; callers must not mutate it
+    TOOL_DEFINITION: Dict[str, Any] = {
+        "name": "get_course_outline",
+        "description": "Get the complete outline of a course including title, link, and all lessons with their numbers and titles",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "course_name": {
+                    "type": "string",
+                    "description": "Course title (partial matches work, e.g. 'MCP', 'Introduction')",
+                }
+            },
+            "required": ["course_name"],
+        },
+    }
+
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
 
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
-        return {
-            "name": "get_course_outline",
-            "description": "Get the complete outline of a course including title, link, and all lessons with their numbers and titles",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "course_name": {
-                        "type": "string",
-                        "description": "Course title (partial matches work, e.g. 'MCP', 'Introduction')",
-                    }
-                },
-                "required": ["course_name"],
-            },
-        }
+        return self.TOOL_DEFINITION
 
     def execute(self, course_name: str) -> str:
         """
@@ -201,16 +229,34 @@ class CourseOutlineTool(Tool):
 class ToolManager:
     """Manages available tools for the AI"""
 
-    def __init__(self):
+    def __init__(self, result_cache_size: int = 1024):
         self.tools = {}
 
-    def register_tool(self, tool: Tool):
-        """Register any tool that implements the Tool interface"""
+        # Memoized results of pure-read tools, cleared when content changes.
+        # (tool name, serialized args) -> (result, sources)
+        self.result_cache_size = result_cache_size
+        self._cacheable = set()
+        self._result_cache: OrderedDict = OrderedDict()
+        # Tools run concurrently on worker threads
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+    def register_tool(self, tool: Tool, cacheable: bool = False):
+        """
+        Register any tool that implements the Tool interface.
+
+        Args:
+            tool: Tool to register
+            cacheable: Whether results depend only on the arguments and the
+                indexed content, so repeat calls can be served from memory
+        """
         tool_def = tool.get_tool_definition()
         tool_name = tool_def.get("name")
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
+        if cacheable:
+            self._cacheable.add(tool_name)
 
     def get_tool_definitions(self) -> list:
         """Get all tool definitions for Anthropic tool calling"""
@@ -218,21 +264,74 @@ class ToolManager:
 
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
+        return self.execute_tool_with_sources(tool_name, **kwargs)[0]
+
+    def execute_tool_with_sources(
+        self, tool_name: str, **kwargs
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a tool by name, returning its result and sources"""
         if tool_name not in self.tools:
-            return f"Tool '{tool_name}' not found"
-
-        return self.tools[tool_name].execute(**kwargs)
-
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources") and tool.last_sources:
-                return tool.last_sources
-        return []
-
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, "last_sources"):
-                tool.last_sources = []
+            return f"Tool '{tool_name}' not found", []
+
+        tool = self.tools[tool_name]
+        if tool_name not in self._cacheable or self.result_cache_size <= 0:
+            return tool.execute_with_sources(**kwargs)
+
+        key = (tool_name, orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS))
+        with self._cache_lock:
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                self._result_cache.move_to_end(key)
+                self.cache_stats["hits"] += 1
+            else:
+                self.cache_stats["misses"] += 1
+
+        if cached is not None:
+            return cached
+
+        # Memoize the pair this call produced, not state another call may
+        # have written to the tool in the meantime
+        cached = tool.execute_with_sources(**kwargs)
+        with self._cache_lock:
+            self._result_cache[key] = cached
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+        return cached
+
+    def clear_result_cache(self):
+        """Drop memoized tool results after the knowledge base changes"""
+        with self._cache_lock:
+            self._result_cache.clear()
+
+    def session(self) -> "ToolSession":
+        """Start collecting sources for a single query"""
+        return ToolSession(self)
+
+
+class ToolSession:
+    """
+    Runs tools for one query and collects the sources they return.
+
+    Each query gets its own session, so concurrent queries (and parallel
+    tool calls within one query) never mix up each other's sources.
+    """
+
+    def __init__(self, manager: ToolManager):
+        self.manager = manager
+        self._sources: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def execute_tool(self, tool_name: str, **kwargs) -> str:
+        """Execute a tool by name and record the sources it returned"""
+        result, sources = self.manager.execute_tool_with_sources(tool_name, **kwargs)
+        if sources:
+            with self._lock:
+                for source in sources:
+                    if source not in self._sources:
+                        self._sources.append(source)
+        return result
+
+    def get_sources(self) -> List[Dict[str, Any]]:
+        """Get the sources of every search run in this session"""
+        with self._lock:
+            return list(self._sources)
@@ -0,0 +1,112 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """Bounded LRU cache that matches entries by embedding cosine similarity"""
+
+    def __init__(self, capacity: int = 512, threshold: float = 0.95):
+        self.capacity = capacity
+        self.threshold = threshold
+        # (namespace, embedding bytes) -> slot, in LRU order
+        self._entries: OrderedDict = OrderedDict()
+
+        # Normalized embeddings live in a preallocated (capacity, dim) matrix,
+        # updated in place on put and evict so lookups never rebuild it.
+        # Allocated on the first put, once the embedding size is known
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[Optional[tuple]] = [None] * capacity
+        self._values: List[Any] = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+        # Namespace id per slot (-1 when free), so one vectorized comparison
+        # picks out the rows a lookup may match
+        self._slot_groups = np.full(capacity, -1, dtype=np.int64)
+        self._group_ids: Dict[Hashable, int] = {}
+        self._group_sizes: Dict[int, int] = {}
+        self._next_group = 0
+
+    @staticmethod
+    def context_key(context: Optional[str]) -> bytes:
+        """Hash free-form context (e.g. conversation history) into a namespace"""
+        return hashlib.blake2b((context or "").encode("utf-8"), digest_size=8).digest()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, namespace: Hashable, embedding) -> Optional[Any]:
+        """Return the cached value most similar to embedding, if above threshold"""
+        group = self._group_ids.get(namespace)
+        if group is None:
+            return None
+
+        scores = self._matrix @ self._normalize(embedding)
+        scores[self._slot_groups != group] = -np.inf
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+
+        # Refresh LRU position on hit
+        self._entries.move_to_end(self._keys[best])
+        return self._values[best]
+
+    def put(self, namespace: Hashable, embedding, value: Any):
+        """Store a value under the given namespace and embedding"""
+        if self.capacity <= 0:
+            return
+
+        vector = self._normalize(embedding)
+        key = (namespace, vector.tobytes())
+        slot = self._entries.get(key)
+        if slot is not None:
+            self._values[slot] = value
+            self._entries.move_to_end(key)
+            return
+
+        # Evict the least recently used entry once at capacity
+        if not self._free:
+            self._evict(*self._entries.popitem(last=False))
+
+        if self._matrix is None:
+            self._matrix = np.zeros((self.capacity, vector.size), dtype=np.float32)
+
+        group = self._group_ids.get(namespace)
+        if group is None:
+            group = self._group_ids[namespace] = self._next_group
+            self._next_group += 1
+        self._group_sizes[group] = self._group_sizes.get(group, 0) + 1
+
+        slot = self._free.pop()
+        self._matrix[slot] = vector
+        self._slot_groups[slot] = group
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._entries[key] = slot
+
+    def _evict(self, key: tuple, slot: int):
+        """Release a slot, dropping its namespace once no entries use it"""
+        group = int(self._slot_groups[slot])
+        self._group_sizes[group] -= 1
+        if not self._group_sizes[group]:
+            del self._group_sizes[group]
+            del self._group_ids[key[0]]
+
+        self._slot_groups[slot] = -1
+        self._keys[slot] = None
+        self._values[slot] = None
+        self._free.append(slot)
+
+    def clear(self):
+        """Remove all cached entries"""
+        for key, slot in self._entries.items():
+            self._evict(key, slot)
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
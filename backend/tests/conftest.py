@@ -1,5 +1,6 @@
 """Shared pytest fixtures and configuration"""
 
+import copy
 import sys
 from pathlib import Path
 
@@ -7,15 +8,16 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
+import httpx
 import pytest
-from unittest.mock import MagicMock, Mock
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 from models import Course, CourseChunk, Lesson
 from vector_store import SearchResults
-from fastapi.testclient import TestClient
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_course():
     """Create a sample course for testing"""
     return Course(
@@ -42,7 +44,7 @@ def sample_course():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_course_chunks():
     """Create sample course chunks for testing"""
     return [
@@ -67,7 +69,7 @@ def sample_course_chunks():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_search_results():
     """Create sample search results for testing"""
     return SearchResults(
@@ -92,13 +94,13 @@ def sample_search_results():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_empty_results():
     """Create empty search results for testing"""
     return SearchResults(documents=[], metadata=[], distances=[], error=None)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_error_results():
     """Create error search results for testing"""
     return SearchResults(
@@ -109,7 +111,7 @@ def sample_error_results():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_tool_definitions():
     """Sample tool definitions for testing"""
     return [
@@ -149,7 +151,7 @@ def mock_tool_definitions():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_course_outline():
     """Sample course outline for testing"""
     return {
@@ -176,7 +178,7 @@ def sample_course_outline():
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_anthropic_response():
     """Sample Anthropic API response structure"""
 
@@ -205,9 +207,80 @@ def sample_anthropic_response():
 
 
 @pytest.fixture
-def mock_rag_system():
-    """Create a mock RAG system for API testing"""
-    mock_system = MagicMock()
+def make_results():
+    """Build SearchResults, defaulting every field to empty"""
+
+    def _make(docs=None, meta=None, dists=None, error=None):
+        return SearchResults(
+            documents=docs or [], metadata=meta or [], distances=dists or [], error=error
+        )
+
+    return _make
+
+
+@pytest.fixture(scope="session")
+def mock_config():
+    """Read-only test configuration shared by every RAG system prototype"""
+    from config import Config
+
+    config = Config()
+    config.ANTHROPIC_API_KEY = "test_key"
+    config.ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+    config.EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    config.CHUNK_SIZE = 800
+    config.CHUNK_OVERLAP = 100
+    config.MAX_RESULTS = 5  # Correct value, not 0
+    config.MAX_HISTORY = 2
+    config.RESPONSE_CACHE_SIZE = 0  # Response cache has dedicated tests
+    config.CHROMA_PATH = "./test_chroma"
+    return config
+
+
+@pytest.fixture(scope="session")
+def _rag_prototype(mock_config):
+    """Build a patched RAGSystem once; tests get fresh copies of it"""
+    # Imported here so the anthropic SDK loads only when RAG tests run
+    import rag_system
+
+    # spec_set rejects calls the real classes don't support; don't use
+    # autospec, which inspects every signature and is far slower to build
+    with (
+        patch("rag_system.VectorStore", spec_set=rag_system.VectorStore),
+        patch("rag_system.AIGenerator", spec_set=rag_system.AIGenerator),
+        patch("rag_system.DocumentProcessor", spec_set=rag_system.DocumentProcessor),
+        patch("rag_system.SessionManager", spec_set=rag_system.SessionManager),
+    ):
+        return rag_system.RAGSystem(mock_config)
+
+
+@pytest.fixture
+def fresh_rag_system(_rag_prototype):
+    """
+    Shallow copy of the RAGSystem prototype with new mock collaborators and tools.
+
+    Tests configure collaborators by assigning attributes, so nothing a test
+    touches may be shared with the prototype.
+    """
+    from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
+
+    rag = copy.copy(_rag_prototype)
+    rag.vector_store = MagicMock()
+    rag.ai_generator = MagicMock()
+    rag.document_processor = MagicMock()
+    rag.session_manager = MagicMock()
+
+    # Tools hold the vector store, so rebind them to the fresh mock
+    rag.search_tool = CourseSearchTool(rag.vector_store)
+    rag.outline_tool = CourseOutlineTool(rag.vector_store)
+    rag.tool_manager = ToolManager(_rag_prototype.tool_manager.result_cache_size)
+    rag.tool_manager.register_tool(rag.search_tool, cacheable=True)
+    rag.tool_manager.register_tool(rag.outline_tool, cacheable=True)
+    return rag
+
+
+def _configure_mock_rag_system(mock_system):
+    """Apply the default return values used by the API tests"""
+    mock_system.query = AsyncMock()
     mock_system.query.return_value = (
         "Python is a high-level programming language known for its simple syntax.",
         [{"course_title": "Introduction to Python Programming", "lesson_number": "1"}]
@@ -216,53 +289,67 @@ def mock_rag_system():
         "total_courses": 2,
         "course_titles": ["Introduction to Python Programming", "Advanced Python"]
     }
+
+    async def query_stream(query, session_id):
+        for text in ["Python is ", "a programming language."]:
+            yield {"type": "text", "text": text}
+        yield {"type": "sources", "sources": [{"text": "Python 101", "url": None}]}
+
+    mock_system.query_stream = Mock(side_effect=query_stream)
     mock_system.session_manager.create_session.return_value = "test-session-123"
     mock_system.session_manager.clear_session.return_value = None
+
+
+@pytest.fixture(scope="module")
+def mock_rag_system():
+    """Create a mock RAG system for API testing, shared within a module"""
+    mock_system = MagicMock()
+    _configure_mock_rag_system(mock_system)
     return mock_system
 
 
-@pytest.fixture
-def test_client(mock_rag_system):
-    """Create a FastAPI test client with mocked RAG system"""
-    from fastapi import FastAPI
-    from pydantic import BaseModel
-    from typing import List, Optional, Dict
-
-    # Create a test app without static file mounting
-    app = FastAPI(title="Course Materials RAG System - Test")
-
-    # Pydantic models
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
-
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[Dict[str, Optional[str]]]
-        session_id: str
-
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
-
-    # API endpoints using mock_rag_system
-    @app.post("/api/query", response_model=QueryResponse)
-    async def query_documents(request: QueryRequest):
-        session_id = request.session_id or mock_rag_system.session_manager.create_session()
-        answer, sources = mock_rag_system.query(request.query, session_id)
-        return QueryResponse(answer=answer, sources=sources, session_id=session_id)
-
-    @app.get("/api/courses", response_model=CourseStats)
-    async def get_course_stats():
-        analytics = mock_rag_system.get_course_analytics()
-        return CourseStats(
-            total_courses=analytics["total_courses"],
-            course_titles=analytics["course_titles"]
-        )
+@pytest.fixture(autouse=True)
+def reset_mock_rag_system(request):
+    """Restore the shared mock RAG system's defaults before each API test"""
+    if "mock_rag_system" in request.fixturenames:
+        mock_system = request.getfixturevalue("mock_rag_system")
+        # Clears call history plus return values/side effects set by a test
+        # (e.g. the *_with_error tests)
+        mock_system.reset_mock(return_value=True, side_effect=True)
+        _configure_mock_rag_system(mock_system)
 
-    @app.delete("/api/session/{session_id}")
-    async def delete_session(session_id: str):
-        mock_rag_system.session_manager.clear_session(session_id)
-        return {"success": True}
 
-    return TestClient(app)
+@pytest.fixture(scope="session")
+def test_app():
+    """Import the real FastAPI app once, without a RAG system or frontend"""
+    from fastapi.staticfiles import StaticFiles
+
+    class NoStaticFiles(StaticFiles):
+        """Static files app serving nothing, so no frontend directory is needed"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+
+    # The module-level RAG system is swapped for mock_rag_system per test
+    with (
+        patch("rag_system.RAGSystem"),
+        patch("fastapi.staticfiles.StaticFiles", NoStaticFiles),
+    ):
+        import app
+
+    return app.app
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def async_client(test_app):
+    """Single in-process AsyncClient shared by every API test in a module"""
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def test_client(test_app, async_client, mock_rag_system):
+    """Async API client wired to this test's mocked RAG system"""
+    with patch("app.rag_system", mock_rag_system):
+        yield async_client
@@ -0,0 +1,94 @@
+"""Lightweight fakes for the Anthropic client and ChromaDB collections"""
+
+
+class FakeMessageStream:
+    """Async context manager mimicking client.messages.stream()"""
+
+    def __init__(self, chunks, final_message):
+        self.chunks = chunks
+        self.final_message = final_message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    async def text_stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def get_final_message(self):
+        return self.final_message
+
+
+class FakeMessages:
+    """Stand-in for client.messages that replays canned responses in order"""
+
+    def __init__(self, responses=(), streams=()):
+        self._responses = iter(responses)
+        self._streams = iter(streams)
+        # Keyword arguments of every create/stream call, for assertions
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return next(self._responses)
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return next(self._streams)
+
+
+class FakeAnthropic:
+    """Stand-in for AsyncAnthropic exposing only messages.create/stream"""
+
+    def __init__(self, responses=(), streams=()):
+        self.messages = FakeMessages(responses, streams)
+
+
+class FakeCollection:
+    """Stand-in for a ChromaDB collection that records query/get/add calls"""
+
+    __slots__ = (
+        "query_result",
+        "query_error",
+        "get_result",
+        "query_calls",
+        "get_calls",
+        "add_calls",
+        "modify_calls",
+        "configuration",
+    )
+
+    def __init__(self):
+        # A results dict, or a callable taking the query kwargs
+        self.query_result = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+        self.query_error = None
+        self.get_result = {"ids": [], "metadatas": []}
+        # Keyword arguments of every call, for assertions
+        self.query_calls = []
+        self.get_calls = []
+        self.add_calls = []
+        self.modify_calls = []
+        # Persisted collection configuration, as returned by Chroma
+        self.configuration = {}
+
+    def query(self, **kwargs):
+        self.query_calls.append(kwargs)
+        if self.query_error is not None:
+            raise self.query_error
+        if callable(self.query_result):
+            return self.query_result(**kwargs)
+        return self.query_result
+
+    def get(self, **kwargs):
+        self.get_calls.append(kwargs)
+        return self.get_result
+
+    def add(self, **kwargs):
+        self.add_calls.append(kwargs)
+
+    def modify(self, **kwargs):
+        self.modify_calls.append(kwargs)
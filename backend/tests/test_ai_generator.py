@@ -1,47 +1,181 @@
 """Tests for AIGenerator tool calling functionality"""
 
+import logging
+import threading
+from itertools import repeat
+from types import SimpleNamespace as NS
+from typing import Any, NamedTuple
 from unittest.mock import MagicMock, Mock, patch
 
 import pytest
-from ai_generator import AIGenerator
+from ai_generator import AIGenerator, ToolResult
+from llm_cache import InMemoryCacheBackend, LLMCache
+from pydantic import BaseModel
+from tests.fakes import FakeAnthropic, FakeMessageStream
+
+
+# Immutable API payloads are plain namespaces; Mock is kept for the client
+# and tool manager, where call assertions are needed
+def text_block(text):
+    """Build a text content block"""
+    return NS(type="text", text=text)
+
+
+def tool_use(tool_id, name, tool_input):
+    """Build a tool_use content block"""
+    return NS(type="tool_use", id=tool_id, name=name, input=tool_input)
+
+
+def resp(stop_reason, content):
+    """Build a messages.create response"""
+    return NS(stop_reason=stop_reason, content=content)
+
+
+SEARCH_TOOLS = [{"name": "search_course_content"}]
+
+
+class RoundScenario(NamedTuple):
+    """Scripted Claude responses and the outcome generate_response should reach"""
+
+    responses: list
+    # execute_tool return value, or an exception / callable used as side_effect
+    tool_results: Any
+    expected_api_calls: int
+    expected_tool_calls: int
+    expected_result: str
+
+
+def search_round(tool_id, *text):
+    """Build a tool_use response searching course content"""
+    blocks = [text_block(t) for t in text]
+    return resp("tool_use", [*blocks, tool_use(tool_id, "search_course_content", {})])
+
+
+ROUND_SCENARIOS = {
+    # Two tool rounds, then a forced text-only call
+    "two_rounds": RoundScenario(
+        [
+            search_round("t1"),
+            search_round("t2"),
+            resp("end_turn", [text_block("Lesson 2 covers...")]),
+        ],
+        "Result",
+        3,
+        2,
+        "Lesson 2 covers...",
+    ),
+    # Preamble text alongside the round 2 tool call is not the answer
+    "round_two_preamble": RoundScenario(
+        [
+            search_round("t1"),
+            search_round("t2", "Let me search the next lesson."),
+            resp("end_turn", [text_block("Final answer")]),
+        ],
+        "Result",
+        3,
+        2,
+        "Final answer",
+    ),
+    # Claude answers after one tool round without a further call
+    "natural_completion": RoundScenario(
+        [search_round("t1"), resp("end_turn", [text_block("Here is the answer")])],
+        "Tool result",
+        2,
+        1,
+        "Here is the answer",
+    ),
+    # A failing tool is answered from the template without another API call
+    "tool_error": RoundScenario(
+        [search_round("t1")],
+        Exception("Database connection failed"),
+        1,
+        1,
+        AIGenerator.NO_RESULTS_REPLY,
+    ),
+    "course_not_found": RoundScenario(
+        [search_round("t1")],
+        "No course found matching 'Nope'",
+        1,
+        1,
+        AIGenerator.NO_RESULTS_REPLY,
+    ),
+}
+
+
+@pytest.fixture(scope="class", autouse=True)
+def mock_anthropic_client():
+    """Patch the Anthropic client once per test class"""
+    with (
+        patch("ai_generator.anthropic.AsyncAnthropic") as mock,
+        patch.dict("ai_generator._CLIENT_CACHE", clear=True),
+    ):
+        yield mock
 
 
 class TestAIGenerator:
     """Test AIGenerator functionality"""
 
     @pytest.fixture
-    def mock_anthropic_client(self):
-        """Create a mock Anthropic client"""
-        with patch("ai_generator.anthropic.Anthropic") as mock:
-            yield mock
-
-    @pytest.fixture
-    def ai_generator(self, mock_anthropic_client):
+    def ai_generator(self):
         """Create AIGenerator with mock client"""
         return AIGenerator(api_key="test_key", model="claude-sonnet-4-20250514")
 
     def test_initialization(self, ai_generator):
         """Test AIGenerator initializes with correct parameters"""
         assert ai_generator.model == "claude-sonnet-4-20250514"
-        assert ai_generator.base_params["model"] == "claude-sonnet-4-20250514"
-        assert ai_generator.base_params["temperature"] == 0
-        assert ai_generator.base_params["max_tokens"] == 800
+        assert ai_generator.temperature == 0
+        assert ai_generator.max_tokens == 800
+        assert ai_generator.extra_headers is None
+
+    def test_client_shared_per_api_key(self, mock_anthropic_client):
+        """Test generators with the same API key reuse one client"""
+        # The patch is shared by the class, so start from an empty client cache
+        mock_anthropic_client.reset_mock()
+        # Hand out a distinct client per construction, as the real class does
+        mock_anthropic_client.side_effect = lambda **kwargs: Mock()
+        try:
+            with patch.dict("ai_generator._CLIENT_CACHE", clear=True):
+                model = "claude-sonnet-4-20250514"
+                first = AIGenerator(api_key="test_key", model=model)
+                second = AIGenerator(api_key="test_key", model=model)
+                other = AIGenerator(api_key="other_key", model=model)
+                other_again = AIGenerator(api_key="other_key", model=model)
+        finally:
+            mock_anthropic_client.side_effect = None
+
+        assert first.client is second.client
+        assert other.client is not first.client
+        assert other_again.client is other.client
+        assert mock_anthropic_client.call_count == 2
+
+    async def test_beta_headers_sent_when_configured(self):
+        """Test configured beta flags are sent on every API call"""
+        generator = AIGenerator(
+            api_key="test_key",
+            model="claude-sonnet-4-20250514",
+            betas=["beta-one", "beta-two"],
+        )
+        mock_response = resp("end_turn", [text_block("Answer")])
+        generator.client = FakeAnthropic(repeat(mock_response))
+
+        await generator.generate_response(query="Question")
+
+        call_args = generator.client.messages.calls[-1]
+        assert call_args["extra_headers"] == {"anthropic-beta": "beta-one,beta-two"}
 
-    def test_generate_response_without_tools(self, ai_generator):
+    async def test_generate_response_without_tools(self, ai_generator):
         """Test generating response without tool usage"""
         # Mock the API response
-        mock_response = Mock()
-        mock_response.stop_reason = "end_turn"
-        mock_response.content = [Mock(text="This is a direct answer")]
+        mock_response = resp("end_turn", [text_block("This is a direct answer")])
 
-        ai_generator.client.messages.create = Mock(return_value=mock_response)
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
 
-        result = ai_generator.generate_response(
+        result = await ai_generator.generate_response(
             query="What is 2+2?", conversation_history=None, tools=None
         )
 
         # Verify correct API call
-        call_args = ai_generator.client.messages.create.call_args[1]
+        call_args = ai_generator.client.messages.calls[-1]
         assert call_args["model"] == "claude-sonnet-4-20250514"
         assert call_args["messages"][0]["content"] == "What is 2+2?"
         assert "tools" not in call_args
@@ -49,32 +183,68 @@ class TestAIGenerator:
         # Verify response
         assert result == "This is a direct answer"
 
-    def test_generate_response_with_conversation_history(self, ai_generator):
+    async def test_generate_response_with_conversation_history(self, ai_generator):
         """Test response generation includes conversation history in system prompt"""
-        mock_response = Mock()
-        mock_response.stop_reason = "end_turn"
-        mock_response.content = [Mock(text="Response with context")]
+        mock_response = resp("end_turn", [text_block("Response with context")])
 
-        ai_generator.client.messages.create = Mock(return_value=mock_response)
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
 
         history = "User: Previous question\nAssistant: Previous answer"
 
-        result = ai_generator.generate_response(
+        result = await ai_generator.generate_response(
             query="Follow-up question", conversation_history=history, tools=None
         )
 
-        # Verify history is in system prompt
-        call_args = ai_generator.client.messages.create.call_args[1]
-        assert "Previous conversation:" in call_args["system"]
-        assert history in call_args["system"]
+        # Verify history is in its own system block after the cached prompt
+        call_args = ai_generator.client.messages.calls[-1]
+        static_block, header_block, history_block = call_args["system"]
+        assert static_block["text"] == AIGenerator.SYSTEM_PROMPT
+        assert header_block["text"] == "Previous conversation:"
+        assert history_block["text"] == history
+        assert "cache_control" not in header_block
+        assert "cache_control" not in history_block
+
+        # The static prefix is shared, never rebuilt or concatenated per call
+        assert static_block is AIGenerator.SYSTEM_BLOCK
+        assert header_block is AIGenerator.HISTORY_HEADER_BLOCK
+
+    async def test_history_kept_out_of_cached_prefix(self, ai_generator):
+        """Test growing history leaves the cached prefix byte-identical"""
+        ai_generator.client = FakeAnthropic(
+            repeat(resp("end_turn", [text_block("Answer")]))
+        )
+
+        for history in (None, "User: Q1\nAssistant: A1", "User: Q2\nAssistant: A2"):
+            await ai_generator.generate_response(
+                query="Question", conversation_history=history, tools=None
+            )
+
+        calls = ai_generator.client.messages.calls
+        # Everything up to the breakpoint matches the no-history request
+        assert all(call["system"][0] == calls[0]["system"][0] for call in calls)
+        # History never leaks into the message list
+        assert all(call["messages"] == calls[0]["messages"] for call in calls)
+        assert calls[0]["messages"] == [{"role": "user", "content": "Question"}]
+
+    async def test_system_prompt_marked_for_caching(self, ai_generator):
+        """Test that the static system prompt is a prompt-cache breakpoint"""
+        mock_response = resp("end_turn", [text_block("Answer")])
 
-    def test_generate_response_with_tools(self, ai_generator):
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
+
+        await ai_generator.generate_response(query="Question", tools=None)
+
+        call_args = ai_generator.client.messages.calls[-1]
+        assert len(call_args["system"]) == 1
+        assert call_args["system"][0]["text"] == AIGenerator.SYSTEM_PROMPT
+        assert call_args["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert call_args["system"] is AIGenerator.STATIC_SYSTEM_CONTENT
+
+    async def test_generate_response_with_tools(self, ai_generator):
         """Test that tools are properly passed to API"""
-        mock_response = Mock()
-        mock_response.stop_reason = "end_turn"
-        mock_response.content = [Mock(text="Answer using tools")]
+        mock_response = resp("end_turn", [text_block("Answer using tools")])
 
-        ai_generator.client.messages.create = Mock(return_value=mock_response)
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
 
         tools = [
             {
@@ -84,36 +254,144 @@ class TestAIGenerator:
             }
         ]
 
-        result = ai_generator.generate_response(query="Search question", tools=tools)
+        result = await ai_generator.generate_response(
+            query="Search question", tools=tools
+        )
+
+        # Verify tools passed correctly, with the last one marked for caching
+        call_args = ai_generator.client.messages.calls[-1]
+        assert call_args["tools"] == [
+            {**tools[0], "cache_control": {"type": "ephemeral"}}
+        ]
+        assert call_args["tool_choice"] == {"type": "auto"}
+
+        # Caller's tool definitions are not mutated
+        assert "cache_control" not in tools[0]
+
+    async def test_outline_query_forces_outline_tool_first_round(
+        self, ai_generator, mock_tool_definitions
+    ):
+        """Test outline questions skip tool routing in round 1 only"""
+        round1 = resp(
+            "tool_use",
+            [tool_use("t1", "get_course_outline", {"course_name": "X"})],
+        )
+        round2 = resp("end_turn", [text_block("Outline")])
+        ai_generator.client = FakeAnthropic([round1, round2])
+
+        mock_tool_manager = Mock()
+        mock_tool_manager.execute_tool.return_value = "Course Title: X"
+
+        await ai_generator.generate_response(
+            query="What is the outline of the X course?",
+            tools=mock_tool_definitions,
+            tool_manager=mock_tool_manager,
+        )
+
+        calls = ai_generator.client.messages.calls
+        assert calls[0]["tool_choice"] == {
+            "type": "tool",
+            "name": "get_course_outline",
+        }
+        assert calls[1]["tool_choice"] == {"type": "auto"}
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "What does lesson 2 say about variables?",
+            "Explain the structure of a Python class",
+            "Which lesson covers data structures?",
+            "How do I list files in the lessons folder?",
+        ],
+    )
+    async def test_content_query_keeps_auto_tool_choice(
+        self, ai_generator, mock_tool_definitions, query
+    ):
+        """Test non-outline questions leave tool routing to Claude"""
+        mock_response = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
+
+        await ai_generator.generate_response(
+            query=query,
+            tools=mock_tool_definitions,
+            tool_manager=Mock(),
+        )
+
+        call_args = ai_generator.client.messages.calls[-1]
+        assert call_args["tool_choice"] == {"type": "auto"}
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "Show me the syllabus for MCP",
+            "What is the course structure of the RAG course?",
+            "List all lessons in the Python course",
+        ],
+    )
+    def test_outline_queries_routed(self, ai_generator, mock_tool_definitions, query):
+        """Test outline phrasings force the outline tool"""
+        assert ai_generator._route_tool_choice(
+            query, mock_tool_definitions, Mock()
+        ) == {"type": "tool", "name": "get_course_outline"}
+
+    async def test_outline_query_without_tool_manager_not_forced(
+        self, ai_generator, mock_tool_definitions
+    ):
+        """Test nothing is forced when no tool manager could run the tool"""
+        mock_response = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
+
+        result = await ai_generator.generate_response(
+            query="What is the outline of the X course?",
+            tools=mock_tool_definitions,
+        )
 
-        # Verify tools passed correctly
-        call_args = ai_generator.client.messages.create.call_args[1]
-        assert call_args["tools"] == tools
+        assert result == "Answer"
+        call_args = ai_generator.client.messages.calls[-1]
         assert call_args["tool_choice"] == {"type": "auto"}
 
-    def test_tool_execution_flow(self, ai_generator):
+    async def test_registered_tools_sent_by_reference(
+        self, ai_generator, mock_tool_definitions
+    ):
+        """Test registered tools are prepared once and reused on every call"""
+        tools = [dict(tool) for tool in mock_tool_definitions]
+        ai_generator.register_tools(tools)
+
+        mock_response = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic(repeat(mock_response))
+
+        await ai_generator.generate_response(query="First", tools=tools)
+        await ai_generator.generate_response(query="Second", tools=tools)
+
+        first, second = ai_generator.client.messages.calls
+        assert first["tools"] is second["tools"]
+        assert first["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert list(first["tools"][0]) == sorted(first["tools"][0])
+
+        # Caller's tool definitions are not mutated
+        assert "cache_control" not in tools[-1]
+
+    async def test_tool_execution_flow(self, ai_generator):
         """Test complete tool execution flow"""
         # First response with tool use
-        initial_response = Mock()
-        initial_response.stop_reason = "tool_use"
-        tool_use_block = Mock()
-        tool_use_block.type = "tool_use"
-        tool_use_block.id = "tool_123"
-        tool_use_block.name = "search_course_content"
-        tool_use_block.input = {"query": "Python basics", "course_name": "Python 101"}
-        initial_response.content = [tool_use_block]
+        initial_response = resp(
+            "tool_use",
+            [
+                tool_use(
+                    "tool_123",
+                    "search_course_content",
+                    {"query": "Python basics", "course_name": "Python 101"},
+                )
+            ],
+        )
 
         # Final response after tool execution
-        final_response = Mock()
-        final_response.stop_reason = "end_turn"
-        final_response.content = [
-            Mock(text="Based on the search results, Python is...")
-        ]
-
-        ai_generator.client.messages.create = Mock(
-            side_effect=[initial_response, final_response]
+        final_response = resp(
+            "end_turn", [text_block("Based on the search results, Python is...")]
         )
 
+        ai_generator.client = FakeAnthropic([initial_response, final_response])
+
         # Mock tool manager
         mock_tool_manager = Mock()
         mock_tool_manager.execute_tool.return_value = (
@@ -122,7 +400,7 @@ class TestAIGenerator:
 
         tools = [{"name": "search_course_content"}]
 
-        result = ai_generator.generate_response(
+        result = await ai_generator.generate_response(
             query="What is Python?", tools=tools, tool_manager=mock_tool_manager
         )
 
@@ -132,280 +410,336 @@ class TestAIGenerator:
         )
 
         # Verify two API calls were made (tool use + natural completion)
-        assert ai_generator.client.messages.create.call_count == 2
+        assert len(ai_generator.client.messages.calls) == 2
 
         # Verify final response
         assert result == "Based on the search results, Python is..."
 
-    def test_sequential_tool_calls_two_rounds(self, ai_generator):
-        """Test that Claude can make sequential tool calls across 2 rounds"""
-        # Round 1: Tool use without text
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-        round1_response.content = [
-            Mock(
-                type="tool_use",
-                id="t1",
-                name="search_course_content",
-                input={"query": "MCP"},
-            )
-        ]
-
-        # Round 2: Another tool use
-        round2_response = Mock()
-        round2_response.stop_reason = "tool_use"
-        round2_response.content = [
-            Mock(
-                type="tool_use",
-                id="t2",
-                name="search_course_content",
-                input={"query": "MCP", "lesson_number": 2},
-            )
-        ]
-
-        # Round 3: Final response (tools removed)
-        round3_response = Mock()
-        round3_response.stop_reason = "end_turn"
-        round3_response.content = [Mock(type="text", text="Lesson 2 covers...")]
-
-        ai_generator.client.messages.create = Mock(
-            side_effect=[round1_response, round2_response, round3_response]
+    async def test_structured_tool_result_sent_as_compact_json(self, ai_generator):
+        """Test dict tool results become compact JSON with sorted keys"""
+        tool_response = resp(
+            "tool_use",
+            [tool_use("tool_1", "get_course_outline", {"course_name": "Python"})],
         )
+        final_response = resp("end_turn", [text_block("Done")])
+        ai_generator.client = FakeAnthropic([tool_response, final_response])
 
         mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.side_effect = [
-            "Found MCP course",
-            "Lesson 2: Model Context Protocol implementation",
-        ]
-
-        result = ai_generator.generate_response(
-            query="What's in lesson 2 of MCP?",
-            tools=[{"name": "search_course_content"}],
+        mock_tool_manager.execute_tool.return_value = {
+            "title": "Python 101",
+            "lessons": [1, 2],
+        }
+
+        await ai_generator.generate_response(
+            query="Outline?",
+            tools=[{"name": "get_course_outline"}],
             tool_manager=mock_tool_manager,
         )
 
-        # Verify: 3 API calls (round1, round2, final)
-        assert ai_generator.client.messages.create.call_count == 3
-
-        # Verify: 2 tool executions
-        assert mock_tool_manager.execute_tool.call_count == 2
-
-        # Verify: Final response returned
-        assert result == "Lesson 2 covers..."
-
-        # Verify: Message chain built correctly
-        final_call = ai_generator.client.messages.create.call_args_list[2][1]
-        messages = final_call["messages"]
-        assert len(messages) == 5  # user → asst → user → asst → user
-        assert messages[0]["role"] == "user"
-        assert messages[1]["role"] == "assistant"
-        assert messages[2]["role"] == "user"  # tool results
-        assert messages[3]["role"] == "assistant"
-        assert messages[4]["role"] == "user"  # tool results
-
-    def test_max_rounds_enforced(self, ai_generator):
-        """Test that system enforces maximum of 2 tool-calling rounds"""
-        # Simulate Claude wanting 3 rounds (should be prevented)
-        round1 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(
-                    type="tool_use",
-                    id="t1",
-                    name="search_course_content",
-                    input={"query": "test1"},
-                )
-            ],
-        )
-        round2 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(
-                    type="tool_use",
-                    id="t2",
-                    name="search_course_content",
-                    input={"query": "test2"},
-                )
+        second_call = ai_generator.client.messages.calls[1]
+        tool_result = second_call["messages"][2]["content"][0]
+        assert tool_result["content"] == '{"lessons":[1,2],"title":"Python 101"}'
+
+    async def test_parallel_tool_calls_run_concurrently(self, ai_generator):
+        """Test tool_use blocks in one round execute concurrently, in order"""
+        round1 = resp(
+            "tool_use",
+            [
+                tool_use("t1", "search_course_content", {}),
+                tool_use("t2", "get_course_outline", {}),
             ],
         )
-        # Round 3 should have no tools available - forced to respond
-        round3 = Mock(
-            stop_reason="end_turn", content=[Mock(type="text", text="Final answer")]
-        )
+        round2 = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic([round1, round2])
+
+        # Both tools must be in flight at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
 
-        ai_generator.client.messages.create = Mock(side_effect=[round1, round2, round3])
+        def execute_tool(name, **kwargs):
+            barrier.wait()
+            return f"{name} result"
 
         mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Result"
+        mock_tool_manager.execute_tool.side_effect = execute_tool
 
-        result = ai_generator.generate_response(
-            query="Complex query",
-            tools=[{"name": "search_course_content"}],
+        await ai_generator.generate_response(
+            query="Test",
+            tools=[{"name": "search_course_content"}, {"name": "get_course_outline"}],
             tool_manager=mock_tool_manager,
         )
 
-        # Verify: Exactly 3 API calls (2 tool rounds + 1 final)
-        assert ai_generator.client.messages.create.call_count == 3
-
-        # Verify: Third call has NO tools parameter
-        third_call = ai_generator.client.messages.create.call_args_list[2][1]
-        assert "tools" not in third_call
-        assert "tool_choice" not in third_call
-
-    def test_natural_completion_after_first_tool(self, ai_generator):
-        """Test Claude makes 1 tool call, then returns text without needing second"""
-        # Round 1: Tool use
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-        round1_response.content = [
-            Mock(
-                type="tool_use",
-                id="t1",
-                name="search_course_content",
-                input={"query": "test"},
-            )
+        round2_call = ai_generator.client.messages.calls[1]
+        tool_results = round2_call["messages"][2]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2"]
+        assert [r["content"] for r in tool_results] == [
+            "search_course_content result",
+            "get_course_outline result",
         ]
 
-        # Round 2: Natural completion (no more tools)
-        round2_response = Mock()
-        round2_response.stop_reason = "end_turn"
-        round2_response.content = [Mock(type="text", text="Here is the answer")]
-
-        ai_generator.client.messages.create = Mock(
-            side_effect=[round1_response, round2_response]
+    async def test_parallel_tool_results_keep_request_order(self, ai_generator):
+        """Test results map back to tool_use ids even when they finish out of order"""
+        round1 = resp(
+            "tool_use",
+            [
+                tool_use("t1", "search_course_content", {"query": "slow"}),
+                tool_use("t2", "search_course_content", {"query": "fast"}),
+            ],
         )
+        round2 = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic([round1, round2])
+
+        finished = []
+        # The first-requested call can't finish until the second has
+        fast_done = threading.Event()
+
+        def execute_tool(name, query):
+            if query == "slow":
+                assert fast_done.wait(timeout=5)
+            finished.append(query)
+            if query == "fast":
+                fast_done.set()
+            return f"{query} result"
 
         mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Tool result"
+        mock_tool_manager.execute_tool.side_effect = execute_tool
 
-        result = ai_generator.generate_response(
-            query="Simple query",
+        await ai_generator.generate_response(
+            query="Test",
             tools=[{"name": "search_course_content"}],
             tool_manager=mock_tool_manager,
         )
 
-        # Verify: Only 2 API calls (no unnecessary third call)
-        assert ai_generator.client.messages.create.call_count == 2
-
-        # Verify: Only 1 tool execution
-        assert mock_tool_manager.execute_tool.call_count == 1
-
-        # Verify: Result returned
-        assert result == "Here is the answer"
+        # The fast call completed first, but results follow request order
+        assert finished == ["fast", "slow"]
+        round2_call = ai_generator.client.messages.calls[1]
+        tool_results = round2_call["messages"][2]["content"]
+        assert [(r["tool_use_id"], r["content"]) for r in tool_results] == [
+            ("t1", "slow result"),
+            ("t2", "fast result"),
+        ]
 
-    def test_tools_available_in_both_rounds(self, ai_generator):
-        """Verify tools are passed to API in round 1 and round 2"""
-        round1 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(type="tool_use", id="t1", name="search_course_content", input={})
-            ],
-        )
-        round2 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(type="tool_use", id="t2", name="search_course_content", input={})
+    async def test_run_tools_returns_tool_results(self, ai_generator):
+        """Test tool outcomes are buffered as ToolResult tuples in order"""
+        response = resp(
+            "tool_use",
+            [
+                text_block("Let me search"),
+                tool_use("t1", "search_course_content", {"query": "ok"}),
+                tool_use("t2", "search_course_content", {"query": "boom"}),
             ],
         )
-        round3 = Mock(stop_reason="end_turn", content=[Mock(type="text", text="Done")])
 
-        ai_generator.client.messages.create = Mock(side_effect=[round1, round2, round3])
+        def execute_tool(name, query):
+            if query == "boom":
+                raise RuntimeError("boom")
+            return "found"
+
         mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Result"
+        mock_tool_manager.execute_tool.side_effect = execute_tool
 
-        tools = [{"name": "search_course_content"}]
+        results = await ai_generator._run_tools(response, mock_tool_manager)
 
-        ai_generator.generate_response(
-            query="Test", tools=tools, tool_manager=mock_tool_manager
+        assert results == [
+            ToolResult("t1", "found"),
+            ToolResult("t2", "Error executing tool: boom", True),
+        ]
+        assert results[1].to_block() == {
+            "type": "tool_result",
+            "tool_use_id": "t2",
+            "content": "Error executing tool: boom",
+            "is_error": True,
+        }
+        assert "is_error" not in results[0].to_block()
+
+    async def test_duplicate_tool_calls_executed_once(self, ai_generator):
+        """Test identical tool_use blocks in one round share a single execution"""
+        round1 = resp(
+            "tool_use",
+            [
+                tool_use("t1", "search_course_content", {"query": "MCP"}),
+                tool_use("t2", "search_course_content", {"query": "MCP"}),
+            ],
         )
+        round2 = resp("end_turn", [text_block("Answer")])
+        ai_generator.client = FakeAnthropic([round1, round2])
 
-        # Verify: First API call includes tools
-        first_call = ai_generator.client.messages.create.call_args_list[0][1]
-        assert first_call["tools"] == tools
-        assert first_call["tool_choice"] == {"type": "auto"}
+        mock_tool_manager = Mock()
+        mock_tool_manager.execute_tool.return_value = "MCP result"
 
-        # Verify: Second API call includes tools
-        second_call = ai_generator.client.messages.create.call_args_list[1][1]
-        assert second_call["tools"] == tools
-        assert second_call["tool_choice"] == {"type": "auto"}
+        await ai_generator.generate_response(
+            query="Test",
+            tools=[{"name": "search_course_content"}],
+            tool_manager=mock_tool_manager,
+        )
 
-        # Verify: Final call excludes tools
-        third_call = ai_generator.client.messages.create.call_args_list[2][1]
-        assert "tools" not in third_call
-        assert "tool_choice" not in third_call
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="MCP"
+        )
+        round2_call = ai_generator.client.messages.calls[1]
+        tool_results = round2_call["messages"][2]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2"]
+        assert [r["content"] for r in tool_results] == ["MCP result", "MCP result"]
 
-    def test_context_preserved_across_rounds(self, ai_generator):
-        """Test that message context accumulates correctly across rounds"""
-        round1 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(
-                    type="tool_use",
-                    id="t1",
-                    name="search_course_content",
-                    input={"query": "search1"},
+    @pytest.fixture
+    def run_rounds(self, ai_generator):
+        """Run generate_response (or the streamed variant) against scripted
+        responses and tool results"""
+
+        async def run(
+            responses, tool_results, tools=SEARCH_TOOLS, query="Test", stream=False
+        ):
+            if stream:
+                ai_generator.client = FakeAnthropic(
+                    streams=[
+                        FakeMessageStream(
+                            [b.text for b in r.content if b.type == "text"], r
+                        )
+                        for r in responses
+                    ]
                 )
-            ],
-        )
-        round2 = Mock(
-            stop_reason="end_turn", content=[Mock(type="text", text="Answer")]
+            else:
+                ai_generator.client = FakeAnthropic(responses)
+            tool_manager = Mock()
+            if callable(tool_results) or isinstance(tool_results, Exception):
+                tool_manager.execute_tool.side_effect = tool_results
+            else:
+                tool_manager.execute_tool.return_value = tool_results
+
+            kwargs = dict(query=query, tools=tools, tool_manager=tool_manager)
+            if stream:
+                result = "".join(
+                    [c async for c in ai_generator.generate_response_stream(**kwargs)]
+                )
+            else:
+                result = await ai_generator.generate_response(**kwargs)
+            return result, ai_generator.client.messages.calls, tool_manager
+
+        return run
+
+    @pytest.mark.parametrize(
+        "scenario", ROUND_SCENARIOS.values(), ids=ROUND_SCENARIOS.keys()
+    )
+    @pytest.mark.parametrize("stream", [False, True], ids=["create", "stream"])
+    async def test_round_scenarios(self, run_rounds, scenario, stream):
+        """Test API call and tool execution counts for each round pattern,
+        identical whether or not the response is streamed"""
+        result, calls, tool_manager = await run_rounds(
+            scenario.responses, scenario.tool_results, stream=stream
         )
 
-        ai_generator.client.messages.create = Mock(side_effect=[round1, round2])
+        assert len(calls) == scenario.expected_api_calls
+        assert tool_manager.execute_tool.call_count == scenario.expected_tool_calls
+        assert result == scenario.expected_result
 
-        mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Tool result"
+    async def test_tool_failure_details_logged_not_returned(self, run_rounds, caplog):
+        """Test exception text from a failed tool stays out of the answer"""
+        scenario = ROUND_SCENARIOS["tool_error"]
 
-        ai_generator.generate_response(
-            query="Test query",
-            tools=[{"name": "search_course_content"}],
-            tool_manager=mock_tool_manager,
+        with caplog.at_level(logging.WARNING, logger="ai_generator"):
+            result, _, _ = await run_rounds(scenario.responses, scenario.tool_results)
+
+        assert "Database connection failed" not in result
+        assert "Database connection failed" in caplog.text
+
+    async def test_final_round_disables_tools(self, run_rounds):
+        """Test the call after the max rounds keeps tools but forbids using them"""
+        tools = [{"name": "search_course_content"}]
+        _, calls, _ = await run_rounds(
+            ROUND_SCENARIOS["two_rounds"].responses, "Result", tools=tools
         )
 
-        # Check round 2 messages include full chain
-        round2_call = ai_generator.client.messages.create.call_args_list[1][1]
-        messages = round2_call["messages"]
+        cached_tools = [{**tools[0], "cache_control": {"type": "ephemeral"}}]
+        assert [call["tools"] for call in calls] == [cached_tools] * 3
+        assert [call["tool_choice"]["type"] for call in calls] == [
+            "auto",
+            "auto",
+            "none",
+        ]
+
+        # Every round sends the same prepared list, not a copy
+        assert calls[0]["tools"] is calls[1]["tools"] is calls[2]["tools"]
+
+        # user → asst → user (tool results) → asst → user (tool results)
+        messages = calls[2]["messages"]
+        assert [m["role"] for m in messages] == [
+            "user",
+            "assistant",
+            "user",
+            "assistant",
+            "user",
+        ]
 
+    async def test_context_preserved_across_rounds(self, run_rounds):
+        """Test that message context accumulates correctly across rounds"""
+        scenario = ROUND_SCENARIOS["natural_completion"]
+        _, calls, _ = await run_rounds(
+            scenario.responses, "Tool result", query="Test query"
+        )
+
+        messages = calls[1]["messages"]
         assert len(messages) == 3
         assert messages[0]["content"] == "Test query"
-        assert messages[1]["content"] == round1.content
+        assert messages[1]["content"] == scenario.responses[0].content
         assert messages[2]["role"] == "user"
         assert messages[2]["content"][0]["type"] == "tool_result"
 
-    def test_tool_execution_error_handling(self, ai_generator):
-        """Test graceful handling of tool execution errors"""
-        round1 = Mock(
-            stop_reason="tool_use",
-            content=[
-                Mock(type="tool_use", id="t1", name="search_course_content", input={})
+    async def test_partial_tool_error_still_calls_claude(self, ai_generator):
+        """Test a round with some successful results is finalized by Claude"""
+        round1 = resp(
+            "tool_use",
+            [
+                tool_use("t1", "search_course_content", {}),
+                tool_use("t2", "get_course_outline", {}),
             ],
         )
-        round2 = Mock(
-            stop_reason="end_turn",
-            content=[Mock(type="text", text="I encountered an error with the search")],
-        )
-
-        ai_generator.client.messages.create = Mock(side_effect=[round1, round2])
+        round2 = resp("end_turn", [text_block("Partial answer")])
+        ai_generator.client = FakeAnthropic([round1, round2])
 
         mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.side_effect = Exception(
-            "Database connection failed"
-        )
 
-        result = ai_generator.generate_response(
+        # Tools run concurrently, so fail by name rather than by call order
+        def execute_tool(name, **kwargs):
+            if name == "get_course_outline":
+                raise Exception("Database connection failed")
+            return "Search result"
+
+        mock_tool_manager.execute_tool.side_effect = execute_tool
+
+        result = await ai_generator.generate_response(
             query="Test",
-            tools=[{"name": "search_course_content"}],
+            tools=[{"name": "search_course_content"}, {"name": "get_course_outline"}],
             tool_manager=mock_tool_manager,
         )
 
-        # Verify: Error was handled (didn't crash)
-        assert result == "I encountered an error with the search"
+        assert result == "Partial answer"
+
+        # Verify: Error was passed to Claude with tools disabled
+        round2_call = ai_generator.client.messages.calls[1]
+        tool_results = round2_call["messages"][2]["content"]
+        assert tool_results[1]["is_error"] == True
+        assert "Database connection failed" in tool_results[1]["content"]
+        assert round2_call["tool_choice"] == {"type": "none"}
+
+    @pytest.mark.parametrize(
+        "result, expected",
+        [
+            ("plain text", "plain text"),
+            ({"b": 1, "a": {"d": 2, "c": 3}}, '{"a":{"c":3,"d":2},"b":1}'),
+            ([{"title": "Café"}], '[{"title":"Café"}]'),
+        ],
+    )
+    def test_serialize_tool_result(self, result, expected):
+        """Test tool results serialize to compact, key-sorted JSON"""
+        assert AIGenerator._serialize_tool_result(result) == expected
+
+    def test_tool_error_checks_skip_non_result_blocks(self, ai_generator):
+        """Test the tool error helpers ignore blocks that aren't tool results"""
+        messages = [
+            {"role": "assistant", "content": [text_block("Let me search.")]},
+        ]
 
-        # Verify: Error message was passed to Claude
-        round2_call = ai_generator.client.messages.create.call_args_list[1][1]
-        tool_result = round2_call["messages"][2]["content"][0]
-        assert tool_result["is_error"] == True
-        assert "Database connection failed" in tool_result["content"]
+        assert ai_generator._has_tool_error(messages) is False
+        assert ai_generator._known_failure_reply(messages) is None
 
     def test_system_prompt_content(self, ai_generator):
         """Test that system prompt contains correct instructions"""
@@ -414,3 +748,193 @@ class TestAIGenerator:
         assert "Sequential tool calling" in AIGenerator.SYSTEM_PROMPT
         assert "up to 2 sequential tool calls" in AIGenerator.SYSTEM_PROMPT
         assert "Brief, Concise and focused" in AIGenerator.SYSTEM_PROMPT
+
+    async def test_generate_response_stream_yields_text(self, ai_generator):
+        """Test streaming yields text chunks as they arrive"""
+        ai_generator.client = FakeAnthropic(
+            streams=[FakeMessageStream(["Python ", "is great"], resp("end_turn", []))]
+        )
+
+        chunks = [
+            chunk
+            async for chunk in ai_generator.generate_response_stream(
+                query="What is Python?"
+            )
+        ]
+
+        assert chunks == ["Python ", "is great"]
+        assert len(ai_generator.client.messages.calls) == 1
+
+    async def test_generate_response_stream_yields_before_completion(
+        self, ai_generator
+    ):
+        """Test the first chunk is yielded before the rest is generated"""
+        produced = []
+
+        def chunks():
+            for text in ("Python ", "is great"):
+                produced.append(text)
+                yield text
+
+        ai_generator.client = FakeAnthropic(
+            streams=[FakeMessageStream(chunks(), resp("end_turn", []))]
+        )
+
+        stream = ai_generator.generate_response_stream(query="What is Python?")
+        assert await anext(stream) == "Python "
+        assert produced == ["Python "]
+
+        assert [chunk async for chunk in stream] == ["is great"]
+
+    async def test_generate_response_stream_uses_cache_breakpoints(
+        self, ai_generator, mock_tool_definitions
+    ):
+        """Test streamed requests carry the same prompt-cache breakpoints"""
+        ai_generator.client = FakeAnthropic(
+            streams=[FakeMessageStream(["Answer"], resp("end_turn", []))]
+        )
+
+        chunks = [
+            chunk
+            async for chunk in ai_generator.generate_response_stream(
+                query="What is Python?",
+                conversation_history="User: Hi\nAssistant: Hello",
+                tools=mock_tool_definitions,
+                tool_manager=Mock(),
+            )
+        ]
+
+        assert chunks == ["Answer"]
+        params = ai_generator.client.messages.calls[-1]
+        assert params["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert all("cache_control" not in block for block in params["system"][1:])
+        assert params["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+
+    async def test_generate_response_stream_with_tool_round(self, ai_generator):
+        """Test streaming runs tools, then streams the follow-up answer"""
+        tool_round = resp(
+            "tool_use",
+            [tool_use("t1", "search_course_content", {"query": "Python"})],
+        )
+        ai_generator.client = FakeAnthropic(
+            streams=[
+                FakeMessageStream([], tool_round),
+                FakeMessageStream(["Python is..."], resp("end_turn", [])),
+            ]
+        )
+
+        mock_tool_manager = Mock()
+        mock_tool_manager.execute_tool.return_value = "Search result"
+
+        chunks = [
+            chunk
+            async for chunk in ai_generator.generate_response_stream(
+                query="What is Python?",
+                tools=[{"name": "search_course_content"}],
+                tool_manager=mock_tool_manager,
+            )
+        ]
+
+        assert chunks == ["Python is..."]
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="Python"
+        )
+
+        second_call = ai_generator.client.messages.calls[1]
+        assert len(second_call["messages"]) == 3
+        assert second_call["messages"][2]["content"][0]["content"] == "Search result"
+
+    async def test_generate_response_stream_drops_tool_round_preamble(
+        self, ai_generator
+    ):
+        """Test text written before a tool call is not streamed as the answer"""
+        tool_round = search_round("t1", "Let me search for that.")
+        ai_generator.client = FakeAnthropic(
+            streams=[
+                FakeMessageStream(["Let me search ", "for that."], tool_round),
+                FakeMessageStream(["Python ", "is..."], resp("end_turn", [])),
+            ]
+        )
+
+        mock_tool_manager = Mock()
+        mock_tool_manager.execute_tool.return_value = "Search result"
+
+        chunks = [
+            chunk
+            async for chunk in ai_generator.generate_response_stream(
+                query="What is Python?",
+                tools=SEARCH_TOOLS,
+                tool_manager=mock_tool_manager,
+            )
+        ]
+
+        assert chunks == ["Python ", "is..."]
+        assert len(ai_generator.client.messages.calls) == 2
+
+
+class TestAIGeneratorLLMCache:
+    """Test the exact-match Claude call cache"""
+
+    @pytest.fixture
+    def ai_generator(self):
+        """Create AIGenerator with mock client and an in-memory call cache"""
+        generator = AIGenerator(
+            api_key="test_key",
+            model="claude-sonnet-4-20250514",
+            llm_cache=LLMCache(InMemoryCacheBackend(capacity=8)),
+        )
+        mock_response = resp("end_turn", [text_block("Answer")])
+        generator.client = FakeAnthropic(repeat(mock_response))
+        return generator
+
+    async def test_identical_call_served_from_cache(self, ai_generator):
+        """Test a repeated identical request makes no second API call"""
+        first = await ai_generator.generate_response(query="What is MCP?")
+        second = await ai_generator.generate_response(query="What is MCP?")
+
+        assert first == second == "Answer"
+        assert len(ai_generator.client.messages.calls) == 1
+        assert ai_generator.llm_cache.stats == {"hits": 1, "misses": 1}
+
+    async def test_different_call_misses_cache(self, ai_generator):
+        """Test a different request goes to the API"""
+        await ai_generator.generate_response(query="What is MCP?")
+        await ai_generator.generate_response(query="What is RAG?")
+
+        assert len(ai_generator.client.messages.calls) == 2
+        assert ai_generator.llm_cache.stats == {"hits": 0, "misses": 2}
+
+    async def test_nonzero_temperature_not_cached(self, ai_generator):
+        """Test sampled (temperature > 0) calls always reach the API"""
+        ai_generator.temperature = 0.7
+
+        await ai_generator.generate_response(query="What is MCP?")
+        await ai_generator.generate_response(query="What is MCP?")
+
+        assert len(ai_generator.client.messages.calls) == 2
+        assert ai_generator.llm_cache.stats == {"hits": 0, "misses": 0}
+
+    def test_key_ignores_dict_order_in_sdk_blocks(self):
+        """Test equal SDK blocks hash the same whatever their dict key order"""
+
+        class Block(BaseModel):
+            type: str
+            input: dict
+
+        def params(block):
+            return {"temperature": 0, "messages": [{"content": [block]}]}
+
+        first = Block(type="tool_use", input={"query": "MCP", "lesson_number": 2})
+        second = Block(type="tool_use", input={"lesson_number": 2, "query": "MCP"})
+
+        key = LLMCache.make_key(params(first))
+        assert key is not None
+        assert key == LLMCache.make_key(params(second))
+
+    async def test_expired_entry_refetched(self):
+        """Test entries past their TTL are dropped"""
+        backend = InMemoryCacheBackend()
+        await backend.set("key", "value", ttl=0)
+
+        assert await backend.get("key") is None
+        assert len(backend) == 0
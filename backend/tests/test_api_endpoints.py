@@ -1,15 +1,21 @@
 """API endpoint tests for FastAPI application"""
+import asyncio
+import json
+
 import pytest
 from unittest.mock import patch
 
+# Share the module-scoped AsyncClient's event loop
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
 
 @pytest.mark.api
 class TestQueryEndpoint:
     """Test the /api/query endpoint"""
 
-    def test_query_without_session_id(self, test_client, mock_rag_system):
+    async def test_query_without_session_id(self, test_client, mock_rag_system):
         """Test query endpoint creates a new session when session_id is not provided"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"query": "What is Python?"}
         )
@@ -28,11 +34,11 @@ class TestQueryEndpoint:
         mock_rag_system.session_manager.create_session.assert_called_once()
         mock_rag_system.query.assert_called_once_with("What is Python?", "test-session-123")
 
-    def test_query_with_existing_session_id(self, test_client, mock_rag_system):
+    async def test_query_with_existing_session_id(self, test_client, mock_rag_system):
         """Test query endpoint uses provided session_id"""
         session_id = "existing-session-456"
 
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={
                 "query": "What is Python?",
@@ -49,18 +55,18 @@ class TestQueryEndpoint:
         mock_rag_system.session_manager.create_session.assert_not_called()
         mock_rag_system.query.assert_called_once_with("What is Python?", session_id)
 
-    def test_query_with_invalid_payload(self, test_client):
+    async def test_query_with_invalid_payload(self, test_client):
         """Test query endpoint rejects invalid request payload"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"invalid_field": "value"}
         )
 
         assert response.status_code == 422  # Unprocessable Entity
 
-    def test_query_with_empty_query(self, test_client):
+    async def test_query_with_empty_query(self, test_client):
         """Test query endpoint rejects empty query string"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"query": ""}
         )
@@ -68,12 +74,12 @@ class TestQueryEndpoint:
         # Should accept empty string (validation happens in RAG system)
         assert response.status_code == 200
 
-    def test_query_with_rag_system_error(self, test_client, mock_rag_system):
+    async def test_query_with_rag_system_error(self, test_client, mock_rag_system):
         """Test query endpoint handles RAG system errors"""
         # Configure mock to raise an exception
         mock_rag_system.query.side_effect = Exception("RAG system error")
 
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"query": "What is Python?"}
         )
@@ -82,13 +88,76 @@ class TestQueryEndpoint:
         assert "RAG system error" in response.json()["detail"]
 
 
+@pytest.mark.api
+class TestQueryStreamEndpoint:
+    """Test the /api/query/stream endpoint"""
+
+    async def _read_events(self, response):
+        return [
+            json.loads(line[len("data: "):])
+            async for line in response.aiter_lines()
+            if line.startswith("data: ")
+        ]
+
+    async def test_stream_yields_text_then_sources(self, test_client, mock_rag_system):
+        """Test streamed events carry answer chunks followed by sources"""
+        async with test_client.stream(
+            "POST", "/api/query/stream", json={"query": "What is Python?"}
+        ) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = await self._read_events(response)
+
+        text = "".join(e["text"] for e in events if e["type"] == "text")
+        assert text == "Python is a programming language."
+
+        assert events[-1]["type"] == "sources"
+        assert events[-1]["sources"] == [{"text": "Python 101", "url": None}]
+        assert events[-1]["session_id"] == "test-session-123"
+
+        mock_rag_system.query_stream.assert_called_once_with(
+            "What is Python?", "test-session-123"
+        )
+
+    async def test_stream_uses_existing_session(self, test_client, mock_rag_system):
+        """Test streaming endpoint keeps a provided session_id"""
+        async with test_client.stream(
+            "POST",
+            "/api/query/stream",
+            json={"query": "What is Python?", "session_id": "existing-session"}
+        ) as response:
+            events = await self._read_events(response)
+
+        assert events[-1]["session_id"] == "existing-session"
+        mock_rag_system.session_manager.create_session.assert_not_called()
+
+    async def test_stream_error_reported_in_band(self, test_client, mock_rag_system):
+        """Test a failure mid-stream ends with an error event after the sent text"""
+        async def failing_stream(query, session_id):
+            yield {"type": "text", "text": "Python is "}
+            raise Exception("Claude API error")
+
+        mock_rag_system.query_stream.side_effect = failing_stream
+
+        async with test_client.stream(
+            "POST", "/api/query/stream", json={"query": "What is Python?"}
+        ) as response:
+            assert response.status_code == 200
+            events = await self._read_events(response)
+
+        assert events == [
+            {"type": "text", "text": "Python is "},
+            {"type": "error", "detail": "Claude API error"},
+        ]
+
+
 @pytest.mark.api
 class TestCoursesEndpoint:
     """Test the /api/courses endpoint"""
 
-    def test_get_course_stats(self, test_client, mock_rag_system):
+    async def test_get_course_stats(self, test_client, mock_rag_system):
         """Test courses endpoint returns correct statistics"""
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
@@ -103,14 +172,14 @@ class TestCoursesEndpoint:
         # Verify RAG system was called
         mock_rag_system.get_course_analytics.assert_called_once()
 
-    def test_get_course_stats_empty(self, test_client, mock_rag_system):
+    async def test_get_course_stats_empty(self, test_client, mock_rag_system):
         """Test courses endpoint when no courses exist"""
         mock_rag_system.get_course_analytics.return_value = {
             "total_courses": 0,
             "course_titles": []
         }
 
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
@@ -118,11 +187,11 @@ class TestCoursesEndpoint:
         assert data["total_courses"] == 0
         assert data["course_titles"] == []
 
-    def test_get_course_stats_with_error(self, test_client, mock_rag_system):
+    async def test_get_course_stats_with_error(self, test_client, mock_rag_system):
         """Test courses endpoint handles RAG system errors"""
         mock_rag_system.get_course_analytics.side_effect = Exception("Database error")
 
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
 
         assert response.status_code == 500
         assert "Database error" in response.json()["detail"]
@@ -132,11 +201,11 @@ class TestCoursesEndpoint:
 class TestSessionEndpoint:
     """Test the /api/session/{session_id} endpoint"""
 
-    def test_delete_session(self, test_client, mock_rag_system):
+    async def test_delete_session(self, test_client, mock_rag_system):
         """Test deleting a session"""
         session_id = "test-session-789"
 
-        response = test_client.delete(f"/api/session/{session_id}")
+        response = await test_client.delete(f"/api/session/{session_id}")
 
         assert response.status_code == 200
         data = response.json()
@@ -146,20 +215,20 @@ class TestSessionEndpoint:
         # Verify session manager was called
         mock_rag_system.session_manager.clear_session.assert_called_once_with(session_id)
 
-    def test_delete_nonexistent_session(self, test_client, mock_rag_system):
+    async def test_delete_nonexistent_session(self, test_client, mock_rag_system):
         """Test deleting a nonexistent session (should succeed)"""
         session_id = "nonexistent-session"
 
-        response = test_client.delete(f"/api/session/{session_id}")
+        response = await test_client.delete(f"/api/session/{session_id}")
 
         assert response.status_code == 200
         assert response.json()["success"] is True
 
-    def test_delete_session_with_error(self, test_client, mock_rag_system):
+    async def test_delete_session_with_error(self, test_client, mock_rag_system):
         """Test delete session endpoint handles errors"""
         mock_rag_system.session_manager.clear_session.side_effect = Exception("Session error")
 
-        response = test_client.delete("/api/session/test-session")
+        response = await test_client.delete("/api/session/test-session")
 
         assert response.status_code == 500
         assert "Session error" in response.json()["detail"]
@@ -169,9 +238,9 @@ class TestSessionEndpoint:
 class TestResponseValidation:
     """Test response model validation"""
 
-    def test_query_response_structure(self, test_client):
+    async def test_query_response_structure(self, test_client):
         """Test query response has correct structure"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"query": "What is Python?"}
         )
@@ -188,9 +257,9 @@ class TestResponseValidation:
         for source in data["sources"]:
             assert isinstance(source, dict)
 
-    def test_courses_response_structure(self, test_client):
+    async def test_courses_response_structure(self, test_client):
         """Test courses response has correct structure"""
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
@@ -208,43 +277,43 @@ class TestResponseValidation:
 class TestEndToEndFlow:
     """Test end-to-end API flows"""
 
-    def test_complete_query_flow(self, test_client, mock_rag_system):
+    async def test_complete_query_flow(self, test_client, mock_rag_system):
         """Test complete query flow: create session, query, delete session"""
-        # Step 1: Make initial query (creates session)
-        response1 = test_client.post(
-            "/api/query",
-            json={"query": "What is Python?"}
-        )
-        assert response1.status_code == 200
-        session_id = response1.json()["session_id"]
+        session_id = "existing-session-456"
 
-        # Step 2: Make follow-up query with same session
-        response2 = test_client.post(
-            "/api/query",
-            json={
-                "query": "Tell me more",
-                "session_id": session_id
-            }
+        # Steps 1 and 2 are independent: a fresh query creating a session, and
+        # a follow-up on an existing one
+        response1, response2 = await asyncio.gather(
+            test_client.post("/api/query", json={"query": "What is Python?"}),
+            test_client.post(
+                "/api/query",
+                json={
+                    "query": "Tell me more",
+                    "session_id": session_id
+                }
+            ),
         )
+        assert response1.status_code == 200
+        assert response1.json()["session_id"] == "test-session-123"
         assert response2.status_code == 200
         assert response2.json()["session_id"] == session_id
 
         # Step 3: Delete session
-        response3 = test_client.delete(f"/api/session/{session_id}")
+        response3 = await test_client.delete(f"/api/session/{session_id}")
         assert response3.status_code == 200
         assert response3.json()["success"] is True
 
-    def test_get_courses_then_query(self, test_client, mock_rag_system):
+    async def test_get_courses_then_query(self, test_client, mock_rag_system):
         """Test getting courses then querying about a specific course"""
         # Step 1: Get list of courses
-        response1 = test_client.get("/api/courses")
+        response1 = await test_client.get("/api/courses")
         assert response1.status_code == 200
         courses_data = response1.json()
         assert courses_data["total_courses"] > 0
 
         # Step 2: Query about a specific course
         course_title = courses_data["course_titles"][0]
-        response2 = test_client.post(
+        response2 = await test_client.post(
             "/api/query",
             json={"query": f"Tell me about {course_title}"}
         )
@@ -1,62 +1,51 @@
 """Integration tests for RAG system end-to-end query flow"""
 
-from unittest.mock import MagicMock, Mock, patch
+import asyncio
+import copy
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
-from config import Config
-from rag_system import RAGSystem
 from vector_store import SearchResults
 
+# Canned values shared by the tests below
+MOCK_CONTENT_RESPONSE = (
+    "Python is a high-level programming language known for its simplicity."
+)
+MOCK_HISTORY = "User: What is Python?\nAssistant: Python is a programming language."
+MOCK_LESSON_LINK = "https://example.com/lesson1"
+
+
+def stub_tool_session(rag, sources):
+    """Make every query's tool session report the given sources"""
+    session = Mock()
+    session.get_sources.return_value = sources
+    rag.tool_manager.session = Mock(return_value=session)
+    return session
+
 
 class TestRAGSystemIntegration:
     """Test RAGSystem end-to-end integration"""
 
     @pytest.fixture
-    def mock_config(self):
-        """Create a test configuration"""
-        config = Config()
-        config.ANTHROPIC_API_KEY = "test_key"
-        config.ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
-        config.EMBEDDING_MODEL = "all-MiniLM-L6-v2"
-        config.CHUNK_SIZE = 800
-        config.CHUNK_OVERLAP = 100
-        config.MAX_RESULTS = 5  # Correct value, not 0
-        config.MAX_HISTORY = 2
-        config.CHROMA_PATH = "./test_chroma"
-        return config
-
-    @pytest.fixture
-    def rag_system(self, mock_config):
+    def rag_system(self, fresh_rag_system):
         """Create RAG system with mocked components"""
-        with (
-            patch("rag_system.VectorStore"),
-            patch("rag_system.AIGenerator"),
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
-            return RAGSystem(mock_config)
+        return fresh_rag_system
 
-    def test_query_with_content_question(self, rag_system):
+    async def test_query_with_content_question(self, rag_system):
         """Test end-to-end query flow for content questions"""
         # Mock the AI generator to simulate tool calling
-        mock_ai_response = (
-            "Python is a high-level programming language known for its simplicity."
+        rag_system.ai_generator.generate_response = AsyncMock(
+            return_value=MOCK_CONTENT_RESPONSE
         )
 
-        rag_system.ai_generator.generate_response = Mock(return_value=mock_ai_response)
-
-        # Mock tool manager to return sources
-        rag_system.tool_manager.get_last_sources = Mock(
-            return_value=[
-                {
-                    "text": "Introduction to Python - Lesson 1",
-                    "url": "https://example.com/lesson1",
-                }
-            ]
+        # Mock the query's tool session to return sources
+        session = stub_tool_session(
+            rag_system,
+            [{"text": "Introduction to Python - Lesson 1", "url": MOCK_LESSON_LINK}],
         )
 
         # Execute query
-        response, sources = rag_system.query(
+        response, sources = await rag_system.query(
             "What is Python?", session_id="test_session"
         )
 
@@ -66,50 +55,44 @@ class TestRAGSystemIntegration:
         # Check query was formatted
         assert "What is Python?" in call_args[1]["query"]
 
-        # Check tools were provided
-        assert call_args[1]["tools"] is not None
+        # Check the registered tool list was passed by reference
+        assert call_args[1]["tools"] is rag_system.tool_definitions
         tool_names = [t["name"] for t in call_args[1]["tools"]]
         assert "search_course_content" in tool_names
 
-        # Check tool_manager was provided
-        assert call_args[1]["tool_manager"] == rag_system.tool_manager
+        # Check the query's own tool session was provided
+        assert call_args[1]["tool_manager"] is session
 
         # Verify response
-        assert response == mock_ai_response
+        assert response == MOCK_CONTENT_RESPONSE
 
         # Verify sources were retrieved
         assert len(sources) == 1
         assert sources[0]["text"] == "Introduction to Python - Lesson 1"
 
-    def test_query_creates_session_if_not_provided(self, rag_system):
+    async def test_query_creates_session_if_not_provided(self, rag_system):
         """Test that query creates session when session_id is None"""
-        rag_system.ai_generator.generate_response = Mock(return_value="Answer")
-        rag_system.tool_manager.get_last_sources = Mock(return_value=[])
+        rag_system.ai_generator.generate_response = AsyncMock(return_value="Answer")
         rag_system.session_manager.create_session = Mock(return_value="new_session_123")
 
         # Query without session_id
-        response, sources = rag_system.query("Test question")
+        response, sources = await rag_system.query("Test question")
 
         # Session should NOT be created (only AI should use history if provided)
         # Based on code, session is only used to get history, not created
         # The session creation happens in app.py, not in RAGSystem
         assert response == "Answer"
 
-    def test_query_uses_conversation_history(self, rag_system):
+    async def test_query_uses_conversation_history(self, rag_system):
         """Test that query includes conversation history from session"""
-        mock_history = (
-            "User: What is Python?\nAssistant: Python is a programming language."
-        )
-
         rag_system.session_manager.get_conversation_history = Mock(
-            return_value=mock_history
+            return_value=MOCK_HISTORY
         )
-        rag_system.ai_generator.generate_response = Mock(
+        rag_system.ai_generator.generate_response = AsyncMock(
             return_value="More details about Python..."
         )
-        rag_system.tool_manager.get_last_sources = Mock(return_value=[])
 
-        response, sources = rag_system.query(
+        response, sources = await rag_system.query(
             "Tell me more", session_id="existing_session"
         )
 
@@ -120,52 +103,98 @@ class TestRAGSystemIntegration:
 
         # Verify history passed to AI generator
         call_args = rag_system.ai_generator.generate_response.call_args[1]
-        assert call_args["conversation_history"] == mock_history
+        assert call_args["conversation_history"] == MOCK_HISTORY
 
-    def test_query_updates_conversation_history(self, rag_system):
+    async def test_query_updates_conversation_history(self, rag_system):
         """Test that query updates session history after getting response"""
-        rag_system.ai_generator.generate_response = Mock(
+        rag_system.ai_generator.generate_response = AsyncMock(
             return_value="Python is great!"
         )
-        rag_system.tool_manager.get_last_sources = Mock(return_value=[])
         rag_system.session_manager.get_conversation_history = Mock(return_value=None)
 
         query_text = "What is Python?"
-        response, sources = rag_system.query(query_text, session_id="test_session")
+        response, sources = await rag_system.query(
+            query_text, session_id="test_session"
+        )
 
         # Verify session was updated with exchange
         rag_system.session_manager.add_exchange.assert_called_once_with(
             "test_session", query_text, "Python is great!"
         )
 
-    def test_query_resets_sources_after_retrieval(self, rag_system):
-        """Test that sources are reset after being retrieved"""
-        rag_system.ai_generator.generate_response = Mock(return_value="Answer")
-        rag_system.tool_manager.get_last_sources = Mock(
-            return_value=[{"text": "Source 1", "url": None}]
-        )
-        rag_system.tool_manager.reset_sources = Mock()
+    async def test_each_query_gets_its_own_tool_session(self, rag_system):
+        """Test sources come from a tool session started for the query"""
+        rag_system.ai_generator.generate_response = AsyncMock(return_value="Answer")
+        session = stub_tool_session(rag_system, [{"text": "Source 1", "url": None}])
 
-        response, sources = rag_system.query("Test")
+        await rag_system.query("Test")
+        response, sources = await rag_system.query("Another test")
 
-        # Verify sources were retrieved
-        rag_system.tool_manager.get_last_sources.assert_called_once()
+        # Verify a fresh session was started per query
+        assert rag_system.tool_manager.session.call_count == 2
+
+        # Verify sources were read from the session
+        assert session.get_sources.call_count == 2
+        assert sources == [{"text": "Source 1", "url": None}]
+
+    async def test_query_stream_yields_text_then_sources(self, rag_system):
+        """Test streamed query forwards chunks, then sources, then saves history"""
+
+        async def fake_stream(**kwargs):
+            for text in ["Python is ", "great!"]:
+                yield text
 
-        # Verify sources were reset after retrieval
-        rag_system.tool_manager.reset_sources.assert_called_once()
+        rag_system.ai_generator.generate_response_stream = Mock(side_effect=fake_stream)
+        session = stub_tool_session(rag_system, [{"text": "Source 1", "url": None}])
+        rag_system.session_manager.get_conversation_history = Mock(return_value=None)
+
+        events = [
+            event
+            async for event in rag_system.query_stream(
+                "What is Python?", session_id="test_session"
+            )
+        ]
+
+        assert events == [
+            {"type": "text", "text": "Python is "},
+            {"type": "text", "text": "great!"},
+            {"type": "sources", "sources": [{"text": "Source 1", "url": None}]},
+        ]
+        session.get_sources.assert_called_once()
+        rag_system.session_manager.add_exchange.assert_called_once_with(
+            "test_session", "What is Python?", "Python is great!"
+        )
 
-    def test_query_without_sources(self, rag_system):
+    async def test_query_without_sources(self, rag_system):
         """Test query that doesn't trigger tool use returns empty sources"""
-        rag_system.ai_generator.generate_response = Mock(
+        rag_system.ai_generator.generate_response = AsyncMock(
             return_value="The capital of France is Paris."
         )
-        rag_system.tool_manager.get_last_sources = Mock(return_value=[])
 
-        response, sources = rag_system.query("What is the capital of France?")
+        response, sources = await rag_system.query("What is the capital of France?")
 
         # Should return empty sources for general knowledge questions
         assert sources == []
 
+    async def test_concurrent_queries_overlap(self, rag_system):
+        """Test concurrent queries wait on Claude together, not one by one"""
+        # Each call waits until all three are in flight; queries handled one
+        # at a time would time out at the barrier
+        all_started = asyncio.Barrier(3)
+
+        async def slow_generate(**kwargs):
+            async with asyncio.timeout(5):
+                await all_started.wait()
+            return "Answer"
+
+        rag_system.ai_generator.generate_response = AsyncMock(side_effect=slow_generate)
+
+        results = await asyncio.gather(
+            *(rag_system.query(f"Question {i}") for i in range(3))
+        )
+
+        assert [response for response, _ in results] == ["Answer"] * 3
+
     def test_tool_manager_has_required_tools(self, rag_system):
         """Test that tool manager has search and outline tools registered"""
         tool_definitions = rag_system.tool_manager.get_tool_definitions()
@@ -190,68 +219,46 @@ class TestRAGSystemWithRealToolFlow:
     """Test RAG system with more realistic tool execution flow"""
 
     @pytest.fixture
-    def mock_config(self):
-        """Create a test configuration"""
-        config = Config()
-        config.ANTHROPIC_API_KEY = "test_key"
-        config.ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
-        config.EMBEDDING_MODEL = "all-MiniLM-L6-v2"
-        config.CHUNK_SIZE = 800
-        config.CHUNK_OVERLAP = 100
-        config.MAX_RESULTS = 5  # Correct value, not 0
-        config.MAX_HISTORY = 2
-        config.CHROMA_PATH = "./test_chroma"
-        return config
-
-    @pytest.fixture
-    def rag_system_with_mocked_vector_store(self, mock_config):
+    def rag_system_with_mocked_vector_store(self, fresh_rag_system):
         """Create RAG system with mocked vector store but real tool flow"""
-        with (
-            patch("rag_system.VectorStore") as MockVectorStore,
-            patch("rag_system.AIGenerator") as MockAIGenerator,
-            patch("rag_system.DocumentProcessor"),
-            patch("rag_system.SessionManager"),
-        ):
-
-            # Create the RAG system
-            rag = RAGSystem(mock_config)
-
-            # Setup vector store mock to return search results
-            mock_search_results = SearchResults(
-                documents=["Python is a high-level programming language."],
-                metadata=[{"course_title": "Python 101", "lesson_number": 1}],
-                distances=[0.5],
-                error=None,
-            )
-            rag.vector_store.search = Mock(return_value=mock_search_results)
-            rag.vector_store.get_lesson_link = Mock(
-                return_value="https://example.com/lesson1"
-            )
+        rag = fresh_rag_system
+
+        # Setup vector store mock to return search results
+        mock_search_results = SearchResults(
+            documents=["Python is a high-level programming language."],
+            metadata=[{"course_title": "Python 101", "lesson_number": 1}],
+            distances=[0.5],
+            error=None,
+        )
+        rag.vector_store.search = Mock(return_value=mock_search_results)
+        rag.vector_store.get_lesson_link = Mock(return_value=MOCK_LESSON_LINK)
 
-            # Setup AI generator to simulate tool use
-            def mock_generate(
-                query, conversation_history=None, tools=None, tool_manager=None
-            ):
-                if tool_manager and tools:
-                    # Simulate AI deciding to use search tool
-                    result = tool_manager.execute_tool(
-                        "search_course_content",
-                        query="Python basics",
-                        course_name="Python 101",
-                    )
-                    # Return a response that synthesizes the search result
-                    return "Based on the course material, Python is a high-level programming language."
-                return "Direct answer without tools"
-
-            rag.ai_generator.generate_response = Mock(side_effect=mock_generate)
-
-            return rag
-
-    def test_realistic_tool_execution_flow(self, rag_system_with_mocked_vector_store):
+        # Setup AI generator to simulate tool use
+        async def mock_generate(
+            query, conversation_history=None, tools=None, tool_manager=None
+        ):
+            if tool_manager and tools:
+                # Simulate AI deciding to use search tool
+                result = tool_manager.execute_tool(
+                    "search_course_content",
+                    query="Python basics",
+                    course_name="Python 101",
+                )
+                # Return a response that synthesizes the search result
+                return "Based on the course material, Python is a high-level programming language."
+            return "Direct answer without tools"
+
+        rag.ai_generator.generate_response = mock_generate
+
+        return rag
+
+    async def test_realistic_tool_execution_flow(
+        self, rag_system_with_mocked_vector_store
+    ):
         """Test realistic flow where AI uses search tool"""
         rag = rag_system_with_mocked_vector_store
 
-        response, sources = rag.query("What is Python?", session_id="test")
+        response, sources = await rag.query("What is Python?", session_id="test")
 
         # Verify vector store was searched
         rag.vector_store.search.assert_called()
@@ -262,4 +269,86 @@ class TestRAGSystemWithRealToolFlow:
         # Verify sources were tracked
         assert len(sources) == 1
         assert sources[0]["text"] == "Python 101 - Lesson 1"
-        assert sources[0]["url"] == "https://example.com/lesson1"
+        assert sources[0]["url"] == MOCK_LESSON_LINK
+
+
+class TestRAGSystemResponseCache:
+    """Test the semantic response cache in front of AI generation"""
+
+    @pytest.fixture
+    def rag_system(self, mock_config):
+        """Create RAG system with response caching enabled"""
+        from rag_system import RAGSystem
+
+        config = copy.copy(mock_config)
+        config.RESPONSE_CACHE_SIZE = 8
+        config.RESPONSE_CACHE_THRESHOLD = 0.95
+
+        with (
+            patch("rag_system.VectorStore"),
+            patch("rag_system.AIGenerator"),
+            patch("rag_system.DocumentProcessor"),
+            patch("rag_system.SessionManager"),
+        ):
+            rag = RAGSystem(config)
+
+        # Deterministic embeddings: paraphrases share a vector
+        embeddings = {
+            "What is Python?": [1.0, 0.0, 0.0],
+            "what is Python": [0.99, 0.01, 0.0],
+            "What is MCP?": [0.0, 1.0, 0.0],
+            "What does lesson 1 of MCP cover?": [0.0, 0.0, 1.0],
+            "What does lesson 2 of MCP cover?": [0.0, 0.01, 0.99],
+        }
+        rag.vector_store.embed_query = lambda query: embeddings[query]
+        rag.ai_generator.generate_response = AsyncMock(return_value="Python is...")
+        stub_tool_session(rag, [{"text": "Python 101 - Lesson 1", "url": None}])
+        rag.session_manager.get_conversation_history = Mock(return_value=None)
+        return rag
+
+    async def test_similar_query_served_from_cache(self, rag_system):
+        """Test a near-duplicate query skips AI generation and keeps sources"""
+        first = await rag_system.query("What is Python?")
+        second = await rag_system.query("what is Python")
+
+        assert rag_system.ai_generator.generate_response.call_count == 1
+        assert second == first
+        assert second[1] == [{"text": "Python 101 - Lesson 1", "url": None}]
+
+    async def test_dissimilar_query_misses_cache(self, rag_system):
+        """Test an unrelated query still calls the AI generator"""
+        await rag_system.query("What is Python?")
+        await rag_system.query("What is MCP?")
+
+        assert rag_system.ai_generator.generate_response.call_count == 2
+
+    async def test_different_lesson_number_misses_cache(self, rag_system):
+        """Test queries that differ only by lesson number are not a cache hit"""
+        await rag_system.query("What does lesson 1 of MCP cover?")
+        await rag_system.query("What does lesson 2 of MCP cover?")
+
+        assert rag_system.ai_generator.generate_response.call_count == 2
+
+    async def test_cache_scoped_to_conversation_history(self, rag_system):
+        """Test the same query with different history is not a cache hit"""
+        await rag_system.query("What is Python?", session_id="s1")
+
+        rag_system.session_manager.get_conversation_history = Mock(
+            return_value="User: Hi\nAssistant: Hello"
+        )
+        await rag_system.query("What is Python?", session_id="s1")
+
+        assert rag_system.ai_generator.generate_response.call_count == 2
+
+    async def test_adding_course_clears_cache(self, rag_system):
+        """Test the cache is invalidated when course content changes"""
+        rag_system.document_processor.process_course_document.return_value = (
+            Mock(),
+            [],
+        )
+
+        await rag_system.query("What is Python?")
+        rag_system.add_course_document("course.txt")
+        await rag_system.query("What is Python?")
+
+        assert rag_system.ai_generator.generate_response.call_count == 2
@@ -1,24 +1,41 @@
 """Tests for CourseSearchTool and CourseOutlineTool"""
 
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, Mock
 
 import pytest
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
-from vector_store import SearchResults
+
+
+@pytest.fixture
+def mock_vector_store():
+    """Create a mock vector store"""
+    return Mock()
+
+
+@pytest.fixture(scope="session")
+def _search_tool_proto():
+    """CourseSearchTool built once; tests get copies bound to their own store"""
+    return CourseSearchTool(Mock())
+
+
+@pytest.fixture(scope="session")
+def _outline_tool_proto():
+    """CourseOutlineTool built once; tests get copies bound to their own store"""
+    return CourseOutlineTool(Mock())
 
 
 class TestCourseSearchTool:
     """Test CourseSearchTool functionality"""
 
     @pytest.fixture
-    def mock_vector_store(self):
-        """Create a mock vector store"""
-        return Mock()
-
-    @pytest.fixture
-    def search_tool(self, mock_vector_store):
+    def search_tool(self, _search_tool_proto, mock_vector_store):
         """Create CourseSearchTool with mock vector store"""
-        return CourseSearchTool(mock_vector_store)
+        tool = copy.copy(_search_tool_proto)
+        tool.store = mock_vector_store
+        return tool
 
     def test_get_tool_definition(self, search_tool):
         """Test that tool definition is properly formatted for Anthropic API"""
@@ -31,127 +48,111 @@ class TestCourseSearchTool:
         assert "query" in definition["input_schema"]["properties"]
         assert definition["input_schema"]["required"] == ["query"]
 
-    def test_execute_with_valid_query(self, search_tool, mock_vector_store):
-        """Test execute returns formatted results for valid query"""
-        # Mock successful search results
-        mock_results = SearchResults(
-            documents=["This is course content about Python"],
-            metadata=[{"course_title": "Introduction to Python", "lesson_number": 1}],
-            distances=[0.5],
-            error=None,
+        # The definition is built once, not per call
+        assert search_tool.get_tool_definition() is definition
+
+    @pytest.mark.parametrize(
+        "query, course_name, lesson_number, expected_title, expected_lesson",
+        [
+            ("What is Python?", None, None, "Introduction to Python", 1),
+            ("decorators", "Advanced Python", None, "Advanced Python", 2),
+            ("loops", None, 5, "Python Basics", 5),
+        ],
+        ids=["no_filter", "course_filter", "lesson_filter"],
+    )
+    def test_execute_with_filters(
+        self,
+        search_tool,
+        mock_vector_store,
+        make_results,
+        query,
+        course_name,
+        lesson_number,
+        expected_title,
+        expected_lesson,
+    ):
+        """Test execute passes filters to the vector store and formats results"""
+        lesson_link = f"https://example.com/lesson{expected_lesson}"
+        mock_vector_store.search.return_value = make_results(
+            docs=[f"Course content about {query}"],
+            meta=[{"course_title": expected_title, "lesson_number": expected_lesson}],
+            dists=[0.5],
         )
-        mock_vector_store.search.return_value = mock_results
-        mock_vector_store.get_lesson_link.return_value = "https://example.com/lesson1"
+        mock_vector_store.get_lesson_link.return_value = lesson_link
 
-        result = search_tool.execute(query="What is Python?")
+        result, sources = search_tool.execute_with_sources(
+            query=query, course_name=course_name, lesson_number=lesson_number
+        )
 
         # Verify search was called correctly
         mock_vector_store.search.assert_called_once_with(
-            query="What is Python?", course_name=None, lesson_number=None
+            query=query, course_name=course_name, lesson_number=lesson_number
         )
 
         # Verify result formatting
-        assert "[Introduction to Python - Lesson 1]" in result
-        assert "This is course content about Python" in result
-
-        # Verify sources were tracked
-        assert len(search_tool.last_sources) == 1
-        assert (
-            search_tool.last_sources[0]["text"] == "Introduction to Python - Lesson 1"
-        )
-        assert search_tool.last_sources[0]["url"] == "https://example.com/lesson1"
-
-    def test_execute_with_course_filter(self, search_tool, mock_vector_store):
-        """Test execute passes course_name filter to vector store"""
-        mock_results = SearchResults(
-            documents=["Filtered content"],
-            metadata=[{"course_title": "Advanced Python", "lesson_number": 2}],
-            distances=[0.3],
-            error=None,
-        )
-        mock_vector_store.search.return_value = mock_results
-        mock_vector_store.get_lesson_link.return_value = None
-
-        result = search_tool.execute(query="decorators", course_name="Advanced Python")
-
-        mock_vector_store.search.assert_called_once_with(
-            query="decorators", course_name="Advanced Python", lesson_number=None
-        )
-        assert "Filtered content" in result
-
-    def test_execute_with_lesson_filter(self, search_tool, mock_vector_store):
-        """Test execute passes lesson_number filter to vector store"""
-        mock_results = SearchResults(
-            documents=["Lesson specific content"],
-            metadata=[{"course_title": "Python Basics", "lesson_number": 5}],
-            distances=[0.2],
-            error=None,
-        )
-        mock_vector_store.search.return_value = mock_results
-        mock_vector_store.get_lesson_link.return_value = "https://example.com/lesson5"
-
-        result = search_tool.execute(query="loops", lesson_number=5)
-
-        mock_vector_store.search.assert_called_once_with(
-            query="loops", course_name=None, lesson_number=5
-        )
-        assert "Lesson specific content" in result
-
-    def test_execute_handles_search_error(self, search_tool, mock_vector_store):
-        """Test execute returns error message when search fails"""
-        mock_results = SearchResults(
-            documents=[],
-            metadata=[],
-            distances=[],
-            error="No course found matching 'NonExistent'",
-        )
-        mock_vector_store.search.return_value = mock_results
-
-        result = search_tool.execute(query="test", course_name="NonExistent")
-
-        assert result == "No course found matching 'NonExistent'"
-
-    def test_execute_handles_empty_results(self, search_tool, mock_vector_store):
-        """Test execute returns appropriate message for empty results"""
-        mock_results = SearchResults(
-            documents=[], metadata=[], distances=[], error=None
-        )
-        mock_vector_store.search.return_value = mock_results
-
-        result = search_tool.execute(query="nonexistent topic")
-
-        assert "No relevant content found" in result
-
-    def test_execute_empty_results_with_filters(self, search_tool, mock_vector_store):
-        """Test empty results message includes filter information"""
-        mock_results = SearchResults(
-            documents=[], metadata=[], distances=[], error=None
-        )
-        mock_vector_store.search.return_value = mock_results
-
-        result = search_tool.execute(
-            query="test", course_name="Python Course", lesson_number=3
-        )
-
-        assert "No relevant content found" in result
-        assert "Python Course" in result
-        assert "lesson 3" in result
-
-    def test_format_results_multiple_documents(self, search_tool, mock_vector_store):
+        assert f"[{expected_title} - Lesson {expected_lesson}]" in result
+        assert f"Course content about {query}" in result
+
+        # Verify sources were returned with the results
+        assert sources == [
+            {"text": f"{expected_title} - Lesson {expected_lesson}", "url": lesson_link}
+        ]
+
+    @pytest.mark.parametrize(
+        "kwargs, error, expected_substrings",
+        [
+            (
+                {"query": "test", "course_name": "NonExistent"},
+                "No course found matching 'NonExistent'",
+                ["No course found matching 'NonExistent'"],
+            ),
+            (
+                {"query": "nonexistent topic"},
+                None,
+                ["No relevant content found"],
+            ),
+            (
+                {"query": "test", "course_name": "Python Course", "lesson_number": 3},
+                None,
+                ["No relevant content found", "Python Course", "lesson 3"],
+            ),
+        ],
+        ids=["search_error", "empty", "empty_with_filters"],
+    )
+    def test_execute_without_results(
+        self,
+        search_tool,
+        mock_vector_store,
+        make_results,
+        kwargs,
+        error,
+        expected_substrings,
+    ):
+        """Test execute reports search errors and empty results with filters"""
+        mock_vector_store.search.return_value = make_results(error=error)
+
+        result, sources = search_tool.execute_with_sources(**kwargs)
+
+        for expected in expected_substrings:
+            assert expected in result
+        assert sources == []
+
+    def test_format_results_multiple_documents(
+        self, search_tool, mock_vector_store, make_results
+    ):
         """Test formatting multiple search results"""
-        mock_results = SearchResults(
-            documents=["First document content", "Second document content"],
-            metadata=[
+        mock_results = make_results(
+            docs=["First document content", "Second document content"],
+            meta=[
                 {"course_title": "Course A", "lesson_number": 1},
                 {"course_title": "Course B", "lesson_number": 2},
             ],
-            distances=[0.5, 0.6],
-            error=None,
+            dists=[0.5, 0.6],
         )
         mock_vector_store.search.return_value = mock_results
         mock_vector_store.get_lesson_link.return_value = None
 
-        result = search_tool.execute(query="test")
+        result, sources = search_tool.execute_with_sources(query="test")
 
         # Check both results are formatted
         assert "[Course A - Lesson 1]" in result
@@ -160,40 +161,39 @@ class TestCourseSearchTool:
         assert "Second document content" in result
 
         # Check sources tracked correctly
-        assert len(search_tool.last_sources) == 2
+        assert len(sources) == 2
 
-    def test_sources_without_lesson_number(self, search_tool, mock_vector_store):
+    def test_sources_without_lesson_number(
+        self, search_tool, mock_vector_store, make_results
+    ):
         """Test source formatting when lesson_number is None"""
-        mock_results = SearchResults(
-            documents=["Content without lesson"],
-            metadata=[{"course_title": "General Course", "lesson_number": None}],
-            distances=[0.4],
-            error=None,
+        mock_results = make_results(
+            docs=["Content without lesson"],
+            meta=[{"course_title": "General Course", "lesson_number": None}],
+            dists=[0.4],
         )
         mock_vector_store.search.return_value = mock_results
         mock_vector_store.get_lesson_link.return_value = None
 
-        result = search_tool.execute(query="test")
+        result, sources = search_tool.execute_with_sources(query="test")
 
         # Should not include "Lesson" in header when lesson_number is None
         assert "[General Course]" in result
         assert "Content without lesson" in result
 
         # Source should not have lesson info
-        assert search_tool.last_sources[0]["text"] == "General Course"
-        assert search_tool.last_sources[0]["url"] is None
+        assert sources[0]["text"] == "General Course"
+        assert sources[0]["url"] is None
 
 
 class TestCourseOutlineTool:
     """Test CourseOutlineTool functionality"""
 
     @pytest.fixture
-    def mock_vector_store(self):
-        return Mock()
-
-    @pytest.fixture
-    def outline_tool(self, mock_vector_store):
-        return CourseOutlineTool(mock_vector_store)
+    def outline_tool(self, _outline_tool_proto, mock_vector_store):
+        tool = copy.copy(_outline_tool_proto)
+        tool.store = mock_vector_store
+        return tool
 
     def test_get_tool_definition(self, outline_tool):
         """Test outline tool definition"""
@@ -234,88 +234,183 @@ class TestCourseOutlineTool:
         assert "No course found matching 'NonExistent'" in result
 
 
+class _StubTool:
+    """Plain stand-in for a Tool that records execute() calls"""
+
+    def __init__(self, name, exec_ret=None, sources=None):
+        self._def = {"name": name}
+        self._ret = exec_ret
+        self._sources = sources or []
+        self.calls = []
+
+    def get_tool_definition(self):
+        return self._def
+
+    def execute(self, **kwargs):
+        return self.execute_with_sources(**kwargs)[0]
+
+    def execute_with_sources(self, **kwargs):
+        self.calls.append(kwargs)
+        result = self._ret(**kwargs) if callable(self._ret) else self._ret
+        sources = self._sources(**kwargs) if callable(self._sources) else self._sources
+        return result, sources
+
+
 class TestToolManager:
     """Test ToolManager functionality"""
 
-    def test_register_tool(self):
-        """Test registering a tool"""
-        manager = ToolManager()
-        mock_tool = Mock()
-        mock_tool.get_tool_definition.return_value = {
-            "name": "test_tool",
-            "description": "A test tool",
-        }
+    @pytest.fixture
+    def manager(self):
+        """Create an empty ToolManager"""
+        return ToolManager()
 
-        manager.register_tool(mock_tool)
+    @pytest.fixture
+    def preloaded_manager(self, manager):
+        """ToolManager with two stub tools, the second holding sources"""
+        tool1 = _StubTool("tool1")
+        tool2 = _StubTool(
+            "tool2", sources=[{"text": "Source 1", "url": "https://example.com/1"}]
+        )
+        manager.register_tool(tool1)
+        manager.register_tool(tool2)
+        return manager, tool1, tool2
+
+    def test_register_tool(self, manager):
+        """Test registering a tool"""
+        manager.register_tool(_StubTool("test_tool"))
 
         assert "test_tool" in manager.tools
 
-    def test_get_tool_definitions(self):
+    def test_get_tool_definitions(self, preloaded_manager):
         """Test getting all tool definitions"""
-        manager = ToolManager()
-
-        mock_tool1 = Mock()
-        mock_tool1.get_tool_definition.return_value = {"name": "tool1"}
-
-        mock_tool2 = Mock()
-        mock_tool2.get_tool_definition.return_value = {"name": "tool2"}
-
-        manager.register_tool(mock_tool1)
-        manager.register_tool(mock_tool2)
+        manager, tool1, tool2 = preloaded_manager
 
         definitions = manager.get_tool_definitions()
 
         assert len(definitions) == 2
         assert {"name": "tool1"} in definitions
         assert {"name": "tool2"} in definitions
+        # Definitions are passed through, not copied
+        assert definitions[0] is tool1.get_tool_definition()
+        assert definitions[1] is tool2.get_tool_definition()
 
-    def test_execute_tool(self):
+    def test_execute_tool(self, manager):
         """Test executing a registered tool"""
-        manager = ToolManager()
-
-        mock_tool = Mock()
-        mock_tool.get_tool_definition.return_value = {"name": "search_tool"}
-        mock_tool.execute.return_value = "Search results"
-
-        manager.register_tool(mock_tool)
+        tool = _StubTool("search_tool", exec_ret="Search results")
+        manager.register_tool(tool)
 
         result = manager.execute_tool("search_tool", query="test", course_name="Python")
 
-        mock_tool.execute.assert_called_once_with(query="test", course_name="Python")
+        assert tool.calls == [{"query": "test", "course_name": "Python"}]
         assert result == "Search results"
 
-    def test_execute_nonexistent_tool(self):
+    def test_execute_nonexistent_tool(self, manager):
         """Test executing a tool that doesn't exist"""
-        manager = ToolManager()
-
         result = manager.execute_tool("nonexistent_tool")
 
         assert "Tool 'nonexistent_tool' not found" in result
 
-    def test_get_last_sources(self):
-        """Test retrieving last sources from tools"""
-        manager = ToolManager()
+    def test_session_collects_sources(self, preloaded_manager):
+        """Test a session gathers the sources of the tools it ran"""
+        manager, _, _ = preloaded_manager
+        session = manager.session()
 
-        mock_tool = Mock()
-        mock_tool.get_tool_definition.return_value = {"name": "search_tool"}
-        mock_tool.last_sources = [{"text": "Source 1", "url": "https://example.com/1"}]
+        session.execute_tool("tool1")
+        session.execute_tool("tool2")
+        session.execute_tool("tool2")
 
-        manager.register_tool(mock_tool)
-
-        sources = manager.get_last_sources()
+        sources = session.get_sources()
 
         assert len(sources) == 1
         assert sources[0]["text"] == "Source 1"
 
-    def test_reset_sources(self):
-        """Test resetting sources on all tools"""
-        manager = ToolManager()
+    def test_sessions_do_not_share_sources(self, preloaded_manager):
+        """Test a new session starts without earlier sessions' sources"""
+        manager, _, _ = preloaded_manager
+
+        manager.session().execute_tool("tool2")
+
+        assert manager.session().get_sources() == []
+
+    def test_cacheable_tool_executed_once_per_args(self, manager):
+        """Test identical calls to a cacheable tool reuse the first result"""
+        tool = _StubTool(
+            "search_tool",
+            exec_ret=lambda **kwargs: (
+                "Lesson 2 results" if "lesson_number" in kwargs else "MCP results"
+            ),
+        )
+
+        manager.register_tool(tool, cacheable=True)
+
+        first = manager.execute_tool("search_tool", query="MCP")
+        second = manager.execute_tool("search_tool", query="MCP")
+        other = manager.execute_tool("search_tool", query="MCP", lesson_number=2)
+
+        assert first == second == "MCP results"
+        assert other == "Lesson 2 results"
+        assert len(tool.calls) == 2
+        assert manager.cache_stats == {"hits": 1, "misses": 2}
+
+    def test_cached_result_restores_sources(self, manager):
+        """Test a cache hit replays the sources of the original search"""
+        sources = [{"text": "Source 1", "url": None}]
+        tool = _StubTool("search_tool", exec_ret="Search results", sources=sources)
+        manager.register_tool(tool, cacheable=True)
+
+        manager.session().execute_tool("search_tool", query="test")
+        session = manager.session()
+        session.execute_tool("search_tool", query="test")
+
+        assert session.get_sources() == sources
+        assert len(tool.calls) == 1
+
+    def test_concurrent_searches_keep_their_own_sources(self, manager):
+        """Test concurrent cacheable searches memoize and report their own sources"""
+        # Both searches must be in flight at once before either returns
+        both_started = threading.Barrier(2, timeout=5)
+
+        def sources_for(query):
+            both_started.wait()
+            return [{"text": f"{query} - Lesson 1", "url": None}]
+
+        tool = _StubTool(
+            "search_tool",
+            exec_ret=lambda query: f"{query} results",
+            sources=sources_for,
+        )
+        manager.register_tool(tool, cacheable=True)
+
+        def search(query):
+            session = manager.session()
+            result = session.execute_tool("search_tool", query=query)
+            return result, session.get_sources()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(search, ["Python", "MCP"]))
+
+        assert results == [
+            ("Python results", [{"text": "Python - Lesson 1", "url": None}]),
+            ("MCP results", [{"text": "MCP - Lesson 1", "url": None}]),
+        ]
+
+        # The memoized pairs are the ones each search produced
+        for query in ["Python", "MCP"]:
+            session = manager.session()
+            session.execute_tool("search_tool", query=query)
+            assert session.get_sources() == [
+                {"text": f"{query} - Lesson 1", "url": None}
+            ]
+        assert len(tool.calls) == 2
+
+    def test_result_cache_cleared(self, manager):
+        """Test clearing the result cache forces a fresh execution"""
+        tool = _StubTool("search_tool", exec_ret="Search results")
 
-        mock_tool = Mock()
-        mock_tool.get_tool_definition.return_value = {"name": "search_tool"}
-        mock_tool.last_sources = [{"text": "Source 1"}]
+        manager.register_tool(tool, cacheable=True)
 
-        manager.register_tool(mock_tool)
-        manager.reset_sources()
+        manager.execute_tool("search_tool", query="test")
+        manager.clear_result_cache()
+        manager.execute_tool("search_tool", query="test")
 
-        assert mock_tool.last_sources == []
+        assert len(tool.calls) == 2
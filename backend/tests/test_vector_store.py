@@ -1,70 +1,105 @@
 """Tests for VectorStore with focus on MAX_RESULTS bug"""
 
-from unittest.mock import MagicMock, Mock, patch
+import asyncio
+import os
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 
+import numpy as np
 import pytest
-from vector_store import SearchResults, VectorStore
+import vector_store
+from models import Course, CourseChunk
+from semantic_cache import SemanticCache
+from tests.fakes import FakeCollection
+from vector_store import SearchResults, VectorStore, _build_where
+
+
+@pytest.fixture(scope="module")
+def _chroma_patches():
+    """Patch ChromaDB's client and embedding function once for the module"""
+    with (
+        patch("vector_store.chromadb.PersistentClient") as client_cls,
+        patch(
+            "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
+        ) as embedding_function_cls,
+    ):
+        yield SimpleNamespace(
+            client_cls=client_cls, embedding_function_cls=embedding_function_cls
+        )
+
+
+@pytest.fixture(autouse=True)
+def fake_chroma(_chroma_patches):
+    """Reset the module's ChromaDB patches and client pool for each test"""
+    for mock in vars(_chroma_patches).values():
+        mock.reset_mock(return_value=True, side_effect=True)
+    # Collections report a persisted configuration like real ones do
+    _chroma_patches.client_cls.return_value.get_or_create_collection.side_effect = (
+        lambda **kwargs: FakeCollection()
+    )
+    with patch.dict("vector_store._CLIENT_CACHE", clear=True):
+        yield _chroma_patches
+
+
+@pytest.fixture
+def chroma_path(tmp_path):
+    """Per-test database path, so parallel workers never share one"""
+    return str(tmp_path / "chroma")
 
 
 class TestVectorStoreMaxResults:
     """Test VectorStore MAX_RESULTS behavior - focuses on the critical bug"""
 
     @pytest.fixture
-    def mock_chroma_client(self):
+    def mock_chroma_client(self, fake_chroma):
         """Create mock ChromaDB client"""
-        with patch("vector_store.chromadb.PersistentClient") as mock_client:
-            mock_instance = Mock()
-            mock_client.return_value = mock_instance
-
-            # Mock collections
-            mock_catalog = Mock()
-            mock_content = Mock()
-
-            mock_instance.get_or_create_collection.side_effect = [
-                mock_catalog,
-                mock_content,
-            ]
-
-            yield {
-                "client": mock_instance,
-                "catalog": mock_catalog,
-                "content": mock_content,
-            }
+        mock_instance = Mock()
+        fake_chroma.client_cls.return_value = mock_instance
+
+        # Mock collections
+        mock_catalog = FakeCollection()
+        mock_content = FakeCollection()
+
+        mock_instance.get_or_create_collection.side_effect = [
+            mock_catalog,
+            mock_content,
+        ]
+
+        return {
+            "client": mock_instance,
+            "catalog": mock_catalog,
+            "content": mock_content,
+        }
 
     @pytest.fixture
-    def vector_store_with_max_5(self, mock_chroma_client):
+    def vector_store_with_max_5(self, mock_chroma_client, chroma_path):
         """Create vector store with MAX_RESULTS=5 (correct value)"""
-        with patch(
-            "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-        ):
-            store = VectorStore(
-                chroma_path="./test_db",
-                embedding_model="all-MiniLM-L6-v2",
-                max_results=5,
-            )
-            store.course_catalog = mock_chroma_client["catalog"]
-            store.course_content = mock_chroma_client["content"]
-            return store
+        store = VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="all-MiniLM-L6-v2",
+            max_results=5,
+        )
+        store.course_catalog = mock_chroma_client["catalog"]
+        store.course_content = mock_chroma_client["content"]
+        return store
 
     @pytest.fixture
-    def vector_store_with_max_0(self, mock_chroma_client):
+    def vector_store_with_max_0(self, mock_chroma_client, chroma_path):
         """Create vector store with MAX_RESULTS=0 (bug scenario)"""
-        with patch(
-            "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-        ):
-            store = VectorStore(
-                chroma_path="./test_db",
-                embedding_model="all-MiniLM-L6-v2",
-                max_results=0,  # THE BUG!
-            )
-            store.course_catalog = mock_chroma_client["catalog"]
-            store.course_content = mock_chroma_client["content"]
-            return store
+        store = VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="all-MiniLM-L6-v2",
+            max_results=0,  # THE BUG!
+        )
+        store.course_catalog = mock_chroma_client["catalog"]
+        store.course_content = mock_chroma_client["content"]
+        return store
 
     def test_search_with_max_results_5_returns_results(self, vector_store_with_max_5):
         """Test that search with MAX_RESULTS=5 returns results"""
         # Mock ChromaDB query response
-        vector_store_with_max_5.course_content.query.return_value = {
+        vector_store_with_max_5.course_content.query_result = {
             "documents": [["Result 1", "Result 2", "Result 3"]],
             "metadatas": [
                 [
@@ -79,8 +114,8 @@ class TestVectorStoreMaxResults:
         results = vector_store_with_max_5.search(query="Python basics")
 
         # Verify ChromaDB was called with n_results=5
-        vector_store_with_max_5.course_content.query.assert_called_once()
-        call_args = vector_store_with_max_5.course_content.query.call_args[1]
+        assert len(vector_store_with_max_5.course_content.query_calls) == 1
+        call_args = vector_store_with_max_5.course_content.query_calls[-1]
         assert call_args["n_results"] == 5
 
         # Verify results returned
@@ -92,7 +127,7 @@ class TestVectorStoreMaxResults:
     ):
         """Test THE BUG: search with MAX_RESULTS=0 returns empty results"""
         # Mock ChromaDB to return empty results (as it would with n_results=0)
-        vector_store_with_max_0.course_content.query.return_value = {
+        vector_store_with_max_0.course_content.query_result = {
             "documents": [[]],
             "metadatas": [[]],
             "distances": [[]],
@@ -101,15 +136,59 @@ class TestVectorStoreMaxResults:
         results = vector_store_with_max_0.search(query="Python basics")
 
         # Verify ChromaDB was called with n_results=0 (THE BUG!)
-        vector_store_with_max_0.course_content.query.assert_called_once()
-        call_args = vector_store_with_max_0.course_content.query.call_args[1]
+        assert len(vector_store_with_max_0.course_content.query_calls) == 1
+        call_args = vector_store_with_max_0.course_content.query_calls[-1]
         assert call_args["n_results"] == 0  # This is the problem!
 
         # Verify empty results
         assert results.is_empty()
         assert len(results.documents) == 0
 
-    def test_config_max_results_bug_scenario(self):
+    @pytest.mark.parametrize("max_results, search_ef", [(5, 32), (20, 80), (0, 32)])
+    def test_hnsw_search_ef_scales_with_max_results(
+        self, mock_chroma_client, chroma_path, max_results, search_ef
+    ):
+        """Test the content collection is created with ef_search from max_results"""
+        mock_chroma_client["content"].configuration = {"hnsw": {"ef_search": search_ef}}
+        store = VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="all-MiniLM-L6-v2",
+            max_results=max_results,
+        )
+
+        assert store.course_content is mock_chroma_client["content"]
+        catalog_call, content_call = mock_chroma_client[
+            "client"
+        ].get_or_create_collection.call_args_list
+        assert content_call.kwargs["configuration"] == {
+            "hnsw": {"ef_search": search_ef}
+        }
+        assert "configuration" not in catalog_call.kwargs
+        # The persisted value already matches, so nothing is rewritten
+        assert not store.course_content.modify_calls
+        assert not store.course_catalog.modify_calls
+
+    @pytest.mark.parametrize(
+        "persisted_ef, modified", [(16, True), (None, True), (100, False)]
+    )
+    def test_hnsw_search_ef_only_raised(
+        self, mock_chroma_client, chroma_path, persisted_ef, modified
+    ):
+        """Test an existing collection's ef_search is raised but never lowered"""
+        if persisted_ef is not None:
+            mock_chroma_client["content"].configuration = {
+                "hnsw": {"ef_search": persisted_ef}
+            }
+        store = VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="all-MiniLM-L6-v2",
+            max_results=5,
+        )
+
+        expected = [{"configuration": {"hnsw": {"ef_search": 32}}}] if modified else []
+        assert store.course_content.modify_calls == expected
+
+    def test_config_max_results_bug_scenario(self, chroma_path):
         """Test that config MAX_RESULTS is now fixed (should be 5, not 0)"""
         from config import Config
 
@@ -119,49 +198,97 @@ class TestVectorStoreMaxResults:
 
         # When RAGSystem uses this config, it creates VectorStore with max_results=5
         # This allows searches to return results
-        with (
-            patch("vector_store.chromadb.PersistentClient"),
-            patch(
-                "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-            ),
-        ):
-
-            fixed_store = VectorStore(
-                chroma_path="./test",
-                embedding_model="test",
-                max_results=test_config.MAX_RESULTS,  # 5!
+        fixed_store = VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="test",
+            max_results=test_config.MAX_RESULTS,  # 5!
+        )
+
+        assert fixed_store.max_results == 5
+        # Searches will now request 5 results, fixing the issue
+
+
+class TestVectorStoreEmbeddingBackend:
+    """Test how VectorStore configures its embedding model"""
+
+    @pytest.fixture
+    def embedding_function_cls(self, fake_chroma):
+        return fake_chroma.embedding_function_cls
+
+    def test_client_is_pooled(self, embedding_function_cls, tmp_path):
+        """Test stores on the same path share one ChromaDB client"""
+        path, other_path = str(tmp_path / "chroma"), str(tmp_path / "other")
+        first = VectorStore(chroma_path=path, embedding_model="test-model")
+        second = VectorStore(chroma_path=path, embedding_model="test-model")
+        VectorStore(chroma_path=other_path, embedding_model="test-model")
+
+        assert second.client is first.client
+        paths = [
+            call.kwargs["path"]
+            for call in vector_store.chromadb.PersistentClient.call_args_list
+        ]
+        assert paths == [path, other_path]
+
+    def test_default_backend_is_torch(self, embedding_function_cls, chroma_path):
+        """Test the default store loads the PyTorch model as before"""
+        VectorStore(chroma_path=chroma_path, embedding_model="all-MiniLM-L6-v2")
+
+        embedding_function_cls.assert_called_once_with(model_name="all-MiniLM-L6-v2")
+
+    @pytest.mark.parametrize("cuda", [True, False])
+    def test_auto_device_uses_cuda_when_available(
+        self, embedding_function_cls, chroma_path, cuda
+    ):
+        """Test "auto" picks CUDA only when torch reports a GPU"""
+        with patch("vector_store._cuda_available", return_value=cuda):
+            VectorStore(
+                chroma_path=chroma_path,
+                embedding_model="all-MiniLM-L6-v2",
+                embedding_device="auto",
             )
 
-            assert fixed_store.max_results == 5
-            # Searches will now request 5 results, fixing the issue
+        expected = {"device": "cuda"} if cuda else {}
+        embedding_function_cls.assert_called_once_with(
+            model_name="all-MiniLM-L6-v2", **expected
+        )
+
+    def test_onnx_backend_loads_quantized_model(
+        self, embedding_function_cls, chroma_path
+    ):
+        """Test the ONNX backend and INT8 model file reach SentenceTransformer"""
+        VectorStore(
+            chroma_path=chroma_path,
+            embedding_model="all-MiniLM-L6-v2",
+            embedding_backend="onnx",
+            embedding_model_file="onnx/model_qint8_avx512_vnni.onnx",
+        )
+
+        embedding_function_cls.assert_called_once_with(
+            model_name="all-MiniLM-L6-v2",
+            backend="onnx",
+            model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx"},
+        )
 
 
 class TestVectorStoreSearch:
     """Test VectorStore search functionality"""
 
     @pytest.fixture
-    def mock_vector_store(self):
+    def mock_vector_store(self, chroma_path):
         """Create vector store with mocked ChromaDB"""
-        with (
-            patch("vector_store.chromadb.PersistentClient"),
-            patch(
-                "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-            ),
-        ):
-
-            store = VectorStore(
-                chroma_path="./test_db", embedding_model="test-model", max_results=5
-            )
+        store = VectorStore(
+            chroma_path=chroma_path, embedding_model="test-model", max_results=5
+        )
 
-            # Mock the collections
-            store.course_catalog = Mock()
-            store.course_content = Mock()
+        # Mock the collections
+        store.course_catalog = FakeCollection()
+        store.course_content = FakeCollection()
 
-            return store
+        return store
 
     def test_search_without_filters(self, mock_vector_store):
         """Test basic search without course or lesson filters"""
-        mock_vector_store.course_content.query.return_value = {
+        mock_vector_store.course_content.query_result = {
             "documents": [["Content about Python"]],
             "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
             "distances": [[0.5]],
@@ -170,8 +297,13 @@ class TestVectorStoreSearch:
         results = mock_vector_store.search(query="What is Python?")
 
         # Verify search parameters
-        call_args = mock_vector_store.course_content.query.call_args[1]
-        assert call_args["query_texts"] == ["What is Python?"]
+        call_args = mock_vector_store.course_content.query_calls[-1]
+        mock_vector_store.embedding_function.assert_called_once_with(
+            ["What is Python?"]
+        )
+        assert call_args["query_embeddings"] == [
+            mock_vector_store.embedding_function.return_value[0]
+        ]
         assert call_args["n_results"] == 5
         assert call_args["where"] is None  # No filter
 
@@ -179,17 +311,119 @@ class TestVectorStoreSearch:
         assert not results.is_empty()
         assert len(results.documents) == 1
 
+    def test_search_unfiltered_bypasses_build_filter(self, mock_vector_store):
+        """Test an unfiltered search skips course resolution and filter building"""
+        with patch("vector_store._build_where", wraps=_build_where) as build_where:
+            results = mock_vector_store.search(query="What is Python?", limit=3)
+
+        build_where.assert_not_called()
+        assert not mock_vector_store.course_catalog.get_calls
+        assert not mock_vector_store.course_catalog.query_calls
+        assert mock_vector_store.course_content.query_calls[-1]["n_results"] == 3
+        assert results.is_empty()
+
+    def test_repeated_query_embedded_once(self, mock_vector_store):
+        """Test an identical query reuses the cached embedding"""
+        mock_vector_store.embedding_function = Mock(return_value=[[0.1, 0.2]])
+        mock_vector_store.course_content.query_result = {
+            "documents": [["Content about Python"]],
+            "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
+            "distances": [[0.5]],
+        }
+
+        mock_vector_store.search(query="What is Python?")
+        mock_vector_store.search(query="What is Python?", lesson_number=2)
+        mock_vector_store.search(query="What is MCP?")
+
+        assert mock_vector_store.embedding_function.call_count == 2
+        second_call = mock_vector_store.course_content.query_calls[1]
+        assert second_call["query_embeddings"] == [[0.1, 0.2]]
+
+    def test_similarity_cache_hit_skips_chroma(self, mock_vector_store):
+        """Test a paraphrased query is served from the search cache"""
+        embeddings = {
+            "What is Python?": [1.0, 0.0, 0.0],
+            "Explain Python": [0.99, 0.05, 0.0],
+            "What is MCP?": [0.0, 1.0, 0.0],
+        }
+        mock_vector_store.embedding_function = Mock(
+            side_effect=lambda texts: [embeddings[texts[0]]]
+        )
+        mock_vector_store.search_cache = SemanticCache(capacity=8, threshold=0.97)
+        mock_vector_store.course_content.query_result = {
+            "documents": [["Content about Python"]],
+            "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
+            "distances": [[0.5]],
+        }
+
+        first = mock_vector_store.search(query="What is Python?")
+        second = mock_vector_store.search(query="Explain Python")
+        assert second is first
+        assert len(mock_vector_store.course_content.query_calls) == 1
+
+        # Different filters and dissimilar queries still hit ChromaDB
+        mock_vector_store.search(query="Explain Python", lesson_number=2)
+        mock_vector_store.search(query="What is MCP?")
+        assert len(mock_vector_store.course_content.query_calls) == 3
+
+        # New content invalidates cached results
+        mock_vector_store.add_course_content(
+            [CourseChunk(content="More", course_title="Python 101", chunk_index=0)]
+        )
+        mock_vector_store.search(query="What is Python?")
+        assert len(mock_vector_store.course_content.query_calls) == 4
+
+    def test_search_batch_single_embedding_call(self, mock_vector_store):
+        """Test a batch of queries is embedded and searched in one call each"""
+        queries = [f"query {i}" for i in range(5)]
+        embeddings = [[float(i), 1.0] for i in range(5)]
+        mock_vector_store.embedding_function = Mock(return_value=embeddings)
+        mock_vector_store.course_content.query_result = {
+            "documents": [[f"Doc {i}"] for i in range(5)],
+            "metadatas": [[{"course_title": "Python 101"}] for _ in range(5)],
+            "distances": [[0.1 * i] for i in range(5)],
+        }
+
+        results = mock_vector_store.search_batch(queries, lesson_number=2)
+
+        mock_vector_store.embedding_function.assert_called_once_with(queries)
+        assert len(mock_vector_store.course_content.query_calls) == 1
+        call_args = mock_vector_store.course_content.query_calls[-1]
+        assert call_args["query_embeddings"] == embeddings
+        assert call_args["where"] == {"lesson_number": 2}
+        assert [r.documents for r in results] == [[f"Doc {i}"] for i in range(5)]
+
+    async def test_asearch_is_concurrent(self, mock_vector_store):
+        """Test concurrent async searches don't queue behind each other"""
+        # Every query waits for the others to start, so searches that ran
+        # one at a time would break the barrier instead of passing
+        all_started = threading.Barrier(4, timeout=5)
+
+        def slow_query(**kwargs):
+            all_started.wait()
+            return {
+                "documents": [["Content"]],
+                "metadatas": [[{"course_title": "Python 101"}]],
+                "distances": [[0.5]],
+            }
+
+        mock_vector_store.course_content.query_result = slow_query
+
+        results = await asyncio.gather(
+            *(mock_vector_store.asearch(query=f"query {i}") for i in range(4))
+        )
+
+        assert [r.documents for r in results] == [["Content"]] * 4
+
     def test_search_with_course_name_filter(self, mock_vector_store):
         """Test search with course name filter"""
-        # Mock course resolution
-        mock_vector_store.course_catalog.query.return_value = {
-            "documents": [["Python 101"]],
-            "metadatas": [[{"title": "Python 101"}]],
-            "distances": [[0.1]],
+        # Mock the catalog titles used for course resolution
+        mock_vector_store.course_catalog.get_result = {
+            "ids": ["Python 101", "MCP: Build Rich-Context AI Apps"]
         }
 
         # Mock content search
-        mock_vector_store.course_content.query.return_value = {
+        mock_vector_store.course_content.query_result = {
             "documents": [["Filtered content"]],
             "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
             "distances": [[0.3]],
@@ -197,16 +431,160 @@ class TestVectorStoreSearch:
 
         results = mock_vector_store.search(query="decorators", course_name="Python")
 
-        # Verify course resolution was attempted
-        mock_vector_store.course_catalog.query.assert_called_once()
+        # Resolved from the in-memory titles, without a vector search
+        assert not mock_vector_store.course_catalog.query_calls
 
         # Verify filter was applied
-        call_args = mock_vector_store.course_content.query.call_args[1]
+        call_args = mock_vector_store.course_content.query_calls[-1]
         assert call_args["where"] == {"course_title": "Python 101"}
 
+        # Titles are loaded once and reused
+        mock_vector_store.search(query="tools", course_name="mcp")
+        call_args = mock_vector_store.course_content.query_calls[-1]
+        assert call_args["where"] == {"course_title": "MCP: Build Rich-Context AI Apps"}
+        assert len(mock_vector_store.course_catalog.get_calls) == 1
+
+    def test_course_titles_reloaded_after_metadata_added(self, mock_vector_store):
+        """Test adding a course invalidates the in-memory titles"""
+        mock_vector_store.course_catalog.get_result = {"ids": ["Python 101"]}
+        mock_vector_store.course_content.query_result = {
+            "documents": [[]],
+            "metadatas": [[]],
+            "distances": [[]],
+        }
+        mock_vector_store.search(query="decorators", course_name="Python")
+
+        mock_vector_store.course_catalog.get_result = {
+            "ids": ["Python 101", "Advanced Python"]
+        }
+        mock_vector_store.add_course_metadata(Course(title="Advanced Python"))
+        mock_vector_store.search(query="async", course_name="advanced python")
+
+        assert len(mock_vector_store.course_catalog.get_calls) == 2
+        assert not mock_vector_store.course_catalog.query_calls
+        call_args = mock_vector_store.course_content.query_calls[-1]
+        assert call_args["where"] == {"course_title": "Advanced Python"}
+
+    def test_name_resolution_disk_cached(self, mock_vector_store, chroma_path):
+        """Test vector-resolved course names survive a new VectorStore"""
+        mock_vector_store.course_catalog.query_result = {
+            "documents": [["MCP: Build Rich-Context AI Apps"]],
+            "metadatas": [[{"title": "MCP: Build Rich-Context AI Apps"}]],
+            "distances": [[0.2]],
+        }
+        assert mock_vector_store._resolve_course_name("model context protocol") == (
+            "MCP: Build Rich-Context AI Apps"
+        )
+
+        # The cache file sits beside the database, not inside Chroma's directory
+        assert os.path.dirname(mock_vector_store._name_cache_path) == (
+            os.path.dirname(chroma_path)
+        )
+
+        restarted = VectorStore(chroma_path=chroma_path, embedding_model="test")
+        restarted.course_catalog = FakeCollection()
+
+        assert restarted._resolve_course_name("Model Context Protocol") == (
+            "MCP: Build Rich-Context AI Apps"
+        )
+        assert not restarted.course_catalog.query_calls
+
+        # Adding a course may change the best match, so resolutions are dropped
+        restarted.add_course_metadata(Course(title="Model Context Protocol"))
+        assert not restarted._name_cache
+        assert not os.path.exists(restarted._name_cache_path)
+
+    def test_name_cache_writes_merge_across_stores(
+        self, mock_vector_store, chroma_path
+    ):
+        """Test two stores on one path don't overwrite each other's resolutions"""
+        other = VectorStore(chroma_path=chroma_path, embedding_model="test")
+        other.course_catalog = FakeCollection()
+
+        for store, title in [(mock_vector_store, "Python 101"), (other, "MCP")]:
+            store.course_catalog.query_result = {
+                "documents": [[title]],
+                "metadatas": [[{"title": title}]],
+                "distances": [[0.2]],
+            }
+        mock_vector_store._resolve_course_name("snakes")
+        other._resolve_course_name("model context protocol")
+
+        restarted = VectorStore(chroma_path=chroma_path, embedding_model="test")
+        assert restarted._name_cache == {
+            "snakes": "Python 101",
+            "model context protocol": "MCP",
+        }
+
+    def test_search_after_clear_all_data(self, mock_vector_store, chroma_path):
+        """Test clearing through any store on a path resets every store's caches"""
+        mock_vector_store.search_cache = SemanticCache(capacity=8, threshold=0.97)
+        mock_vector_store.course_catalog.get_result = {"ids": ["Python 101"]}
+        mock_vector_store.course_catalog.query_result = {
+            "documents": [["Python 101"]],
+            "metadatas": [[{"title": "Python 101"}]],
+            "distances": [[0.2]],
+        }
+        mock_vector_store.course_content.query_result = {
+            "documents": [["Old content"]],
+            "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
+            "distances": [[0.5]],
+        }
+        mock_vector_store.search(query="decorators")
+        mock_vector_store.search(query="loops", course_name="Python")
+        mock_vector_store._resolve_course_name("snakes")
+
+        # The new collections are empty; the other store shares the client
+        fresh = {"course_catalog": FakeCollection(), "course_content": FakeCollection()}
+        mock_vector_store.client.get_or_create_collection.side_effect = (
+            lambda name, **kwargs: fresh[name]
+        )
+        other = VectorStore(chroma_path=chroma_path, embedding_model="test-model")
+        other.clear_all_data()
+
+        assert mock_vector_store.course_catalog is fresh["course_catalog"]
+        assert mock_vector_store.course_content is fresh["course_content"]
+        assert mock_vector_store.search(query="decorators").is_empty()
+        assert fresh["course_content"].query_calls
+        assert mock_vector_store._resolve_course_name("Python") is None
+        assert not mock_vector_store._name_cache
+        assert not os.path.exists(mock_vector_store._name_cache_path)
+
+    def test_search_filter_dispatches_in_parallel(self, mock_vector_store):
+        """Test the query is embedded while the course name is resolved"""
+        # Embedding and resolution each wait for the other to start, which
+        # only succeeds if they run at the same time
+        both_started = threading.Barrier(2, timeout=5)
+
+        def slow_embed(texts):
+            both_started.wait()
+            return [[0.1, 0.2]]
+
+        def slow_resolve(**kwargs):
+            both_started.wait()
+            return {
+                "documents": [["Python 101"]],
+                "metadatas": [[{"title": "Python 101"}]],
+                "distances": [[0.1]],
+            }
+
+        mock_vector_store.embedding_function = Mock(side_effect=slow_embed)
+        mock_vector_store.course_catalog.query_result = slow_resolve
+        mock_vector_store.course_content.query_result = {
+            "documents": [["Filtered content"]],
+            "metadatas": [[{"course_title": "Python 101", "lesson_number": 1}]],
+            "distances": [[0.3]],
+        }
+
+        results = mock_vector_store.search(query="decorators", course_name="Python")
+
+        assert results.documents == ["Filtered content"]
+        call_args = mock_vector_store.course_content.query_calls[-1]
+        assert call_args["query_embeddings"] == [[0.1, 0.2]]
+
     def test_search_with_lesson_number_filter(self, mock_vector_store):
         """Test search with lesson number filter"""
-        mock_vector_store.course_content.query.return_value = {
+        mock_vector_store.course_content.query_result = {
             "documents": [["Lesson 5 content"]],
             "metadatas": [[{"course_title": "Python 101", "lesson_number": 5}]],
             "distances": [[0.2]],
@@ -215,20 +593,20 @@ class TestVectorStoreSearch:
         results = mock_vector_store.search(query="loops", lesson_number=5)
 
         # Verify lesson filter
-        call_args = mock_vector_store.course_content.query.call_args[1]
+        call_args = mock_vector_store.course_content.query_calls[-1]
         assert call_args["where"] == {"lesson_number": 5}
 
     def test_search_with_both_filters(self, mock_vector_store):
         """Test search with both course and lesson filters"""
         # Mock course resolution
-        mock_vector_store.course_catalog.query.return_value = {
+        mock_vector_store.course_catalog.query_result = {
             "documents": [["Advanced Python"]],
             "metadatas": [[{"title": "Advanced Python"}]],
             "distances": [[0.1]],
         }
 
         # Mock content search
-        mock_vector_store.course_content.query.return_value = {
+        mock_vector_store.course_content.query_result = {
             "documents": [["Specific content"]],
             "metadatas": [[{"course_title": "Advanced Python", "lesson_number": 3}]],
             "distances": [[0.25]],
@@ -239,16 +617,32 @@ class TestVectorStoreSearch:
         )
 
         # Verify AND filter
-        call_args = mock_vector_store.course_content.query.call_args[1]
+        call_args = mock_vector_store.course_content.query_calls[-1]
         expected_filter = {
             "$and": [{"course_title": "Advanced Python"}, {"lesson_number": 3}]
         }
         assert call_args["where"] == expected_filter
 
+    def test_build_where_memoises(self, mock_vector_store):
+        """Test repeated filters reuse the same dict"""
+        mock_vector_store.course_content.query_result = {
+            "documents": [[]],
+            "metadatas": [[]],
+            "distances": [[]],
+        }
+        hits = _build_where.cache_info().hits
+
+        mock_vector_store.search(query="loops", lesson_number=7)
+        mock_vector_store.search(query="functions", lesson_number=7)
+
+        first, second = mock_vector_store.course_content.query_calls
+        assert second["where"] is first["where"]
+        assert _build_where.cache_info().hits > hits
+
     def test_search_course_not_found(self, mock_vector_store):
         """Test search when course name doesn't match any course"""
         # Mock empty course resolution
-        mock_vector_store.course_catalog.query.return_value = {
+        mock_vector_store.course_catalog.query_result = {
             "documents": [[]],
             "metadatas": [[]],
             "distances": [[]],
@@ -264,7 +658,7 @@ class TestVectorStoreSearch:
 
     def test_search_with_custom_limit(self, mock_vector_store):
         """Test search with custom result limit"""
-        mock_vector_store.course_content.query.return_value = {
+        mock_vector_store.course_content.query_result = {
             "documents": [["Result 1", "Result 2"]],
             "metadatas": [
                 [
@@ -278,12 +672,12 @@ class TestVectorStoreSearch:
         results = mock_vector_store.search(query="test", limit=3)
 
         # Verify custom limit used
-        call_args = mock_vector_store.course_content.query.call_args[1]
+        call_args = mock_vector_store.course_content.query_calls[-1]
         assert call_args["n_results"] == 3
 
     def test_search_handles_exception(self, mock_vector_store):
         """Test search handles ChromaDB exceptions"""
-        mock_vector_store.course_content.query.side_effect = Exception("Database error")
+        mock_vector_store.course_content.query_error = Exception("Database error")
 
         results = mock_vector_store.search(query="test")
 
@@ -307,9 +701,23 @@ class TestSearchResults:
 
         assert results.documents == ["Doc 1", "Doc 2"]
         assert results.metadata == [{"key": "val1"}, {"key": "val2"}]
-        assert results.distances == [0.5, 0.6]
+        assert results.distances.dtype == np.float16
+        assert np.allclose(results.distances, [0.5, 0.6], atol=1e-3)
         assert results.error is None
 
+    def test_from_chroma_is_zerocopy(self):
+        """Test document and metadata rows are used without copying"""
+        chroma_results = {
+            "documents": [["Doc 1"], ["Doc 2"]],
+            "metadatas": [[{"key": "val1"}], [{"key": "val2"}]],
+            "distances": [[0.5], [0.6]],
+        }
+
+        results = SearchResults.from_chroma(chroma_results, row=1)
+
+        assert results.documents is chroma_results["documents"][1]
+        assert results.metadata is chroma_results["metadatas"][1]
+
     def test_from_chroma_empty(self):
         """Test creating SearchResults from empty ChromaDB response"""
         chroma_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
@@ -328,8 +736,57 @@ class TestSearchResults:
 
     def test_is_empty(self):
         """Test is_empty method"""
-        empty_results = SearchResults([], [], [], None)
+        empty_results = SearchResults([], [], np.empty(0, np.float16), None)
         assert empty_results.is_empty()
 
         non_empty_results = SearchResults(["doc"], [{}], [0.5], None)
         assert not non_empty_results.is_empty()
+        assert non_empty_results._empty is False
+
+    def test_search_results_use_slots(self):
+        """Test SearchResults instances carry no per-instance __dict__"""
+        assert not hasattr(SearchResults([], [], [], None), "__dict__")
+
+
+class TestSemanticCache:
+    """Test the similarity cache backing search and response caching"""
+
+    def test_lookup_scoped_to_namespace(self):
+        """Test a similar embedding only matches within its own namespace"""
+        cache = SemanticCache(capacity=4, threshold=0.95)
+        cache.put("a", [1.0, 0.0], "first")
+        cache.put("b", [0.0, 1.0], "second")
+
+        assert cache.get("a", [0.99, 0.01]) == "first"
+        assert cache.get("b", [0.99, 0.01]) is None
+        assert cache.get("c", [1.0, 0.0]) is None
+
+    def test_lru_entry_evicted_and_slot_reused(self):
+        """Test the least recently used entry is evicted at capacity"""
+        cache = SemanticCache(capacity=2, threshold=0.95)
+        cache.put("a", [1.0, 0.0, 0.0], "x")
+        cache.put("b", [0.0, 1.0, 0.0], "y")
+        # Touch "a" so "b" becomes least recently used
+        assert cache.get("a", [1.0, 0.0, 0.0]) == "x"
+
+        cache.put("a", [0.0, 0.0, 1.0], "z")
+
+        assert len(cache) == 2
+        assert cache.get("b", [0.0, 1.0, 0.0]) is None
+        assert cache.get("a", [1.0, 0.0, 0.0]) == "x"
+        assert cache.get("a", [0.0, 0.0, 1.0]) == "z"
+        # The matrix is allocated once and reused in place
+        assert cache._matrix.shape == (2, 3)
+
+    def test_clear_drops_all_entries(self):
+        """Test clear empties the cache and frees every slot"""
+        cache = SemanticCache(capacity=2, threshold=0.95)
+        cache.put("a", [1.0, 0.0], "x")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.get("a", [1.0, 0.0]) is None
+
+        cache.put("a", [0.0, 1.0], "y")
+        cache.put("a", [1.0, 0.0], "x")
+        assert cache.get("a", [0.0, 1.0]) == "y"
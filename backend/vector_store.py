@@ -1,70 +1,205 @@
-from dataclasses import dataclass
+import difflib
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
 import chromadb
+import numpy as np
+import orjson
 from chromadb.config import Settings
+from concurrency import run_blocking
 from models import Course, CourseChunk
+from semantic_cache import SemanticCache
 from sentence_transformers import SentenceTransformer
 
+# Process-wide ChromaDB clients keyed by path, so every VectorStore on the
+# same database shares one set of open SQLite and HNSW files
+_CLIENT_CACHE: Dict[str, chromadb.ClientAPI] = {}
 
-@dataclass
+# Live stores per database path. Clearing the data through one store must
+# refresh the collection handles and caches of every store on that client.
+_STORES: Dict[str, weakref.WeakSet] = {}
+
+
+# Computes query embeddings alongside course name resolution. Kept separate
+# from the app's blocking pool, which search() itself usually runs on.
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="embed")
+
+# Serializes name cache writes across every VectorStore in the process
+_NAME_CACHE_LOCK = threading.Lock()
+
+
+def _cuda_available() -> bool:
+    """Whether torch (installed with sentence-transformers) can see a GPU"""
+    import torch
+
+    return torch.cuda.is_available()
+
+
+def _get_client(chroma_path: str) -> chromadb.ClientAPI:
+    """Return the shared ChromaDB client for a path, creating it once"""
+    client = _CLIENT_CACHE.get(chroma_path)
+    if client is None:
+        client = chromadb.PersistentClient(
+            path=chroma_path, settings=Settings(anonymized_telemetry=False)
+        )
+        _CLIENT_CACHE[chroma_path] = client
+    return client
+
+
+@functools.lru_cache(maxsize=512)
+def _build_where(
+    course_title: Optional[str], lesson_number: Optional[int]
+) -> Optional[Dict]:
+    """
+    Build ChromaDB filter from search parameters.
+
+    Filters are memoised and shared between searches; callers must not
+    mutate them.
+    """
+    if not course_title and lesson_number is None:
+        return None
+
+    # Handle different filter combinations
+    if course_title and lesson_number is not None:
+        return {
+            "$and": [
+                {"course_title": course_title},
+                {"lesson_number": lesson_number},
+            ]
+        }
+
+    if course_title:
+        return {"course_title": course_title}
+
+    return {"lesson_number": lesson_number}
+
+
+@dataclass(slots=True)
 class SearchResults:
     """Container for search results with metadata"""
 
     documents: List[str]
     metadata: List[Dict[str, Any]]
-    distances: List[float]
+    distances: np.ndarray  # float16 (enough to rank), parallel to documents
     error: Optional[str] = None
+    # Computed once; results are not modified after construction
+    _empty: bool = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.distances = np.asarray(self.distances, dtype=np.float16)
+        self._empty = len(self.documents) == 0
 
     @classmethod
-    def from_chroma(cls, chroma_results: Dict) -> "SearchResults":
-        """Create SearchResults from ChromaDB query results"""
-        return cls(
-            documents=(
-                chroma_results["documents"][0] if chroma_results["documents"] else []
-            ),
-            metadata=(
-                chroma_results["metadatas"][0] if chroma_results["metadatas"] else []
-            ),
-            distances=(
-                chroma_results["distances"][0] if chroma_results["distances"] else []
-            ),
+    def from_chroma(cls, chroma_results: Dict, row: int = 0) -> "SearchResults":
+        """
+        Create SearchResults from one query's row of ChromaDB query results.
+
+        Rows are referenced rather than copied; fields ChromaDB left out
+        (None) become empty.
+        """
+        documents, metadata, distances = (
+            values[row] if values else []
+            for values in (
+                chroma_results["documents"],
+                chroma_results["metadatas"],
+                chroma_results["distances"],
+            )
         )
+        return cls(documents=documents, metadata=metadata, distances=distances)
 
     @classmethod
     def empty(cls, error_msg: str) -> "SearchResults":
         """Create empty results with error message"""
-        return cls(documents=[], metadata=[], distances=[], error=error_msg)
+        return cls(
+            documents=[],
+            metadata=[],
+            distances=np.empty(0, dtype=np.float16),
+            error=error_msg,
+        )
 
     def is_empty(self) -> bool:
         """Check if results are empty"""
-        return len(self.documents) == 0
+        return self._empty
 
 
 class VectorStore:
     """Vector storage using ChromaDB for course content and metadata"""
 
-    def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5):
+    def __init__(
+        self,
+        chroma_path: str,
+        embedding_model: str,
+        max_results: int = 5,
+        embedding_backend: str = "torch",
+        embedding_model_file: Optional[str] = None,
+        embedding_device: str = "cpu",
+        query_cache_size: int = 1024,
+        search_cache_size: int = 0,
+        search_cache_threshold: float = 0.97,
+    ):
         self.max_results = max_results
         # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=chroma_path, settings=Settings(anonymized_telemetry=False)
-        )
-
-        # Set up sentence transformer embedding function
+        self.chroma_path = chroma_path
+        self.client = _get_client(chroma_path)
+        _STORES.setdefault(chroma_path, weakref.WeakSet()).add(self)
+
+        # Set up sentence transformer embedding function. Non-torch backends
+        # can load a specific export, such as an INT8 quantized ONNX file, and
+        # "auto" moves the model to the GPU when one is available.
+        model_options = {}
+        if embedding_device == "auto":
+            embedding_device = "cuda" if _cuda_available() else "cpu"
+        if embedding_device != "cpu":
+            model_options["device"] = embedding_device
+        if embedding_backend != "torch":
+            model_options["backend"] = embedding_backend
+        if embedding_model_file:
+            model_options["model_kwargs"] = {"file_name": embedding_model_file}
         self.embedding_function = (
             chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=embedding_model
+                model_name=embedding_model, **model_options
             )
         )
 
+        # Repeated queries skip the transformer forward pass; query embeddings
+        # don't depend on stored content, so the cache never needs clearing
+        self.embed_query = functools.lru_cache(maxsize=query_cache_size)(
+            self._embed_query
+        )
+
+        # Content search results for near-duplicate queries, namespaced by
+        # filter and limit. search() runs on worker threads, hence the lock.
+        self.search_cache = (
+            SemanticCache(search_cache_size, search_cache_threshold)
+            if search_cache_size > 0
+            else None
+        )
+        self._search_cache_lock = threading.Lock()
+
+        # HNSW candidate list size for content searches. Chroma's default
+        # (100) oversearches for top-5 retrieval; scale it with max_results.
+        self.search_ef = max(32, 4 * max(max_results, 1))
+
+        # Lowercased title -> title, loaded from the catalog on first use
+        self._course_titles: Optional[Dict[str, str]] = None
+
+        # Course names resolved by vector search, persisted beside (not
+        # inside) the database directory so restarts don't repeat the
+        # catalog query
+        self._name_cache_path = os.path.normpath(chroma_path) + ".name_cache.json"
+        self._name_cache = self._load_name_cache()
+
         # Create collections for different types of data
         self.course_catalog = self._create_collection(
             "course_catalog"
         )  # Course titles/instructors
-        self.course_content = self._create_collection(
-            "course_content"
-        )  # Actual course material
+        # Actual course material
+        self.course_content = self._create_content_collection()
 
     def _create_collection(self, name: str):
         """Create or get a ChromaDB collection"""
@@ -72,6 +207,25 @@ class VectorStore:
             name=name, embedding_function=self.embedding_function
         )
 
+    def _create_content_collection(self):
+        """Create or get the content collection with search_ef applied"""
+        collection = self.client.get_or_create_collection(
+            name="course_content",
+            embedding_function=self.embedding_function,
+            configuration={"hnsw": {"ef_search": self.search_ef}},
+        )
+        # The setting is persisted and shared by every store on this path,
+        # so an existing collection is only ever raised to this store's
+        # search_ef - never lowered below what another store needs
+        hnsw = collection.configuration.get("hnsw") or {}
+        if hnsw.get("ef_search", 0) < self.search_ef:
+            collection.modify(configuration={"hnsw": {"ef_search": self.search_ef}})
+        return collection
+
+    def _embed_query(self, query: str):
+        """Embed a single query string"""
+        return self.embedding_function([query])[0]
+
     def search(
         self,
         query: str,
@@ -91,61 +245,227 @@ class VectorStore:
         Returns:
             SearchResults object with documents and metadata
         """
+        # Use provided limit or fall back to configured max_results
+        search_limit = limit if limit is not None else self.max_results
+        if not course_name and lesson_number is None:
+            return self._search_unfiltered(query, search_limit)
+        return self.search_batch([query], course_name, lesson_number, limit)[0]
+
+    def _search_unfiltered(self, query: str, search_limit: int) -> SearchResults:
+        """Fast path for the common search with no course or lesson filter"""
+        try:
+            embedding = self.embed_query(query)
+            cache_namespace = (None, None, search_limit)
+            cached = self._get_cached_search(cache_namespace, embedding)
+            if cached is not None:
+                return cached
+
+            results = SearchResults.from_chroma(
+                self.course_content.query(
+                    query_embeddings=[embedding], n_results=search_limit, where=None
+                )
+            )
+            self._put_cached_search(cache_namespace, embedding, results)
+            return results
+        except Exception as e:
+            return SearchResults.empty(f"Search error: {str(e)}")
+
+    async def asearch(
+        self,
+        query: str,
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> SearchResults:
+        """search() for async callers, run on the shared blocking pool"""
+        return await run_blocking(self.search, query, course_name, lesson_number, limit)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        course_name: Optional[str] = None,
+        lesson_number: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[SearchResults]:
+        """
+        Search course content for several queries sharing the same filters.
+
+        The queries are embedded in one model call and sent to ChromaDB as a
+        single query, e.g. for multi-query retrieval over rewritten questions.
+
+        Args:
+            queries: What to search for in course content
+            course_name: Optional course name/title to filter by
+            lesson_number: Optional lesson number to filter by
+            limit: Maximum results to return per query
+
+        Returns:
+            One SearchResults per query, in order
+        """
         # Step 1: Resolve course name if provided
         course_title = None
+        query_embeddings = None
         if course_name:
-            course_title = self._resolve_course_name(course_name)
+            course_title = self._match_course_title(course_name)
+            if course_title is None:
+                # Fall back to vector search. The query embeddings don't
+                # depend on the resolved title, so compute them in parallel.
+                query_embeddings = _PREFETCH_EXECUTOR.submit(
+                    self._embed_queries, queries
+                )
+                course_title = self._search_course_name(course_name)
             if not course_title:
-                return SearchResults.empty(f"No course found matching '{course_name}'")
+                return [
+                    SearchResults.empty(f"No course found matching '{course_name}'")
+                    for _ in queries
+                ]
 
         # Step 2: Build filter for content search
-        filter_dict = self._build_filter(course_title, lesson_number)
+        filter_dict = _build_where(course_title, lesson_number)
 
         # Step 3: Search course content
         # Use provided limit or fall back to configured max_results
         search_limit = limit if limit is not None else self.max_results
 
         try:
-            results = self.course_content.query(
-                query_texts=[query], n_results=search_limit, where=filter_dict
+            embeddings = (
+                query_embeddings.result()
+                if query_embeddings is not None
+                else self._embed_queries(queries)
             )
-            return SearchResults.from_chroma(results)
+            cache_namespace = (course_title, lesson_number, search_limit)
+            results = [
+                self._get_cached_search(cache_namespace, embedding)
+                for embedding in embeddings
+            ]
+
+            # Query ChromaDB once for every query the cache couldn't answer
+            misses = [i for i, cached in enumerate(results) if cached is None]
+            if misses:
+                chroma_results = self.course_content.query(
+                    query_embeddings=[embeddings[i] for i in misses],
+                    n_results=search_limit,
+                    where=filter_dict,
+                )
+                for row, i in enumerate(misses):
+                    results[i] = SearchResults.from_chroma(chroma_results, row)
+                    self._put_cached_search(cache_namespace, embeddings[i], results[i])
+            return results
         except Exception as e:
-            return SearchResults.empty(f"Search error: {str(e)}")
+            return [SearchResults.empty(f"Search error: {str(e)}") for _ in queries]
+
+    def _embed_queries(self, queries: List[str]) -> List:
+        """Embed queries; a single query goes through the embedding cache"""
+        if len(queries) == 1:
+            return [self.embed_query(queries[0])]
+        return list(self.embedding_function(queries))
+
+    def _get_cached_search(self, namespace, embedding) -> Optional[SearchResults]:
+        """Return cached results for a near-duplicate query, if any"""
+        if self.search_cache is None:
+            return None
+        with self._search_cache_lock:
+            return self.search_cache.get(namespace, embedding)
+
+    def _put_cached_search(self, namespace, embedding, results: SearchResults):
+        """Cache content search results under the query embedding"""
+        if self.search_cache is None:
+            return
+        with self._search_cache_lock:
+            self.search_cache.put(namespace, embedding, results)
+
+    def _clear_search_cache(self):
+        """Drop cached search results after the content changes"""
+        if self.search_cache is None:
+            return
+        with self._search_cache_lock:
+            self.search_cache.clear()
 
     def _resolve_course_name(self, course_name: str) -> Optional[str]:
+        """Find the best matching course title for a course name"""
+        return self._match_course_title(course_name) or self._search_course_name(
+            course_name
+        )
+
+    def _match_course_title(self, course_name: str) -> Optional[str]:
+        """
+        Match a course name against the known titles without touching ChromaDB.
+
+        Tries an exact match, then a title uniquely containing the name, then
+        a close spelling. Returns None when none of these is conclusive.
+        """
+        titles = self._course_titles
+        if titles is None:
+            titles = self._course_titles = {
+                title.lower(): title for title in self.get_existing_course_titles()
+            }
+
+        name = course_name.strip().lower()
+        if name in titles:
+            return titles[name]
+
+        containing = [key for key in titles if name in key]
+        if len(containing) == 1:
+            return titles[containing[0]]
+
+        close = difflib.get_close_matches(name, titles, n=1, cutoff=0.8)
+        return titles[close[0]] if close else None
+
+    def _search_course_name(self, course_name: str) -> Optional[str]:
         """Use vector search to find best matching course by name"""
+        key = course_name.strip().lower()
+        cached = self._name_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             results = self.course_catalog.query(query_texts=[course_name], n_results=1)
 
             if results["documents"][0] and results["metadatas"][0]:
                 # Return the title (which is now the ID)
-                return results["metadatas"][0][0]["title"]
+                title = results["metadatas"][0][0]["title"]
+                self._remember_course_name(key, title)
+                return title
         except Exception as e:
             print(f"Error resolving course name: {e}")
 
         return None
 
-    def _build_filter(
-        self, course_title: Optional[str], lesson_number: Optional[int]
-    ) -> Optional[Dict]:
-        """Build ChromaDB filter from search parameters"""
-        if not course_title and lesson_number is None:
-            return None
-
-        # Handle different filter combinations
-        if course_title and lesson_number is not None:
-            return {
-                "$and": [
-                    {"course_title": course_title},
-                    {"lesson_number": lesson_number},
-                ]
-            }
-
-        if course_title:
-            return {"course_title": course_title}
-
-        return {"lesson_number": lesson_number}
+    def _load_name_cache(self) -> Dict[str, str]:
+        """Read persisted course name resolutions, if any"""
+        try:
+            with open(self._name_cache_path, "rb") as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading course name cache: {e}")
+            return {}
+
+    def _remember_course_name(self, key: str, title: str):
+        """Record a resolution and write the cache through to disk"""
+        with _NAME_CACHE_LOCK:
+            # Merge with what other stores on this path have written since
+            # this one loaded, rather than overwriting their entries
+            self._name_cache = {**self._load_name_cache(), key: title}
+            try:
+                tmp_path = f"{self._name_cache_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(orjson.dumps(self._name_cache))
+                os.replace(tmp_path, self._name_cache_path)
+            except OSError as e:
+                print(f"Error saving course name cache: {e}")
+
+    def _forget_course_names(self):
+        """Drop resolutions once the catalog changes, as best matches may move"""
+        with _NAME_CACHE_LOCK:
+            self._name_cache = {}
+            try:
+                os.remove(self._name_cache_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error clearing course name cache: {e}")
 
     def add_course_metadata(self, course: Course):
         """Add course information to the catalog for semantic search"""
@@ -179,6 +499,8 @@ class VectorStore:
             ],
             ids=[course.title],
         )
+        self._course_titles = None
+        self._forget_course_names()
 
     def add_course_content(self, chunks: List[CourseChunk]):
         """Add course content chunks to the vector store"""
@@ -201,18 +523,33 @@ class VectorStore:
         ]
 
         self.course_content.add(documents=documents, metadatas=metadatas, ids=ids)
+        self._clear_search_cache()
 
     def clear_all_data(self):
         """Clear all data from both collections"""
         try:
             self.client.delete_collection("course_catalog")
             self.client.delete_collection("course_content")
-            # Recreate collections
-            self.course_catalog = self._create_collection("course_catalog")
-            self.course_content = self._create_collection("course_content")
         except Exception as e:
             print(f"Error clearing data: {e}")
 
+        # Stores sharing the client hold handles to the deleted collections
+        for store in list(_STORES.get(self.chroma_path, ())):
+            store._reset_collections()
+
+    def _reset_collections(self):
+        """Recreate collection handles and drop everything cached from them"""
+        try:
+            self.course_catalog = self._create_collection("course_catalog")
+            self.course_content = self._create_content_collection()
+        except Exception as e:
+            print(f"Error recreating collections: {e}")
+        finally:
+            # Query embeddings don't depend on stored data and stay cached
+            self._course_titles = None
+            self._forget_course_names()
+            self._clear_search_cache()
+
     def get_existing_course_titles(self) -> List[str]:
         """Get all existing course titles from the vector store"""
         try:
@@ -76,7 +76,7 @@ async function sendMessage() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 
     try {
-        const response = await fetch(`${API_URL}/query`, {
+        const response = await fetch(`${API_URL}/query/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -89,17 +89,47 @@ async function sendMessage() {
 
         if (!response.ok) throw new Error('Query failed');
 
-        const data = await response.json();
-        
-        // Update session ID if new
-        if (!currentSessionId) {
-            currentSessionId = data.session_id;
+        // Render the answer as server-sent events arrive instead of waiting
+        // for the full completion
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let messageDiv = null;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+
+            for (const raw of events) {
+                if (!raw.startsWith('data: ')) continue;
+                const event = JSON.parse(raw.slice('data: '.length));
+
+                if (event.type === 'error') throw new Error(event.detail);
+
+                if (!messageDiv) {
+                    // Swap the loading indicator for the answer on first event
+                    loadingMessage.remove();
+                    messageDiv = createMessageElement('assistant');
+                }
+
+                if (event.type === 'text') {
+                    answer += event.text;
+                    renderMessage(messageDiv, answer, 'assistant');
+                } else if (event.type === 'sources') {
+                    // Update session ID if new
+                    if (!currentSessionId) {
+                        currentSessionId = event.session_id;
+                    }
+                    renderMessage(messageDiv, answer, 'assistant', event.sources);
+                }
+            }
         }
 
-        // Replace loading message with response
-        loadingMessage.remove();
-        addMessage(data.answer, 'assistant', data.sources);
-
     } catch (error) {
         // Replace loading message with error
         loadingMessage.remove();
@@ -127,11 +157,21 @@ function createLoadingMessage() {
 }
 
 function addMessage(content, type, sources = null, isWelcome = false) {
+    const messageDiv = createMessageElement(type, isWelcome);
+    renderMessage(messageDiv, content, type, sources);
+    return messageDiv.id;
+}
+
+function createMessageElement(type, isWelcome = false) {
     const messageId = Date.now();
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${type}${isWelcome ? ' welcome-message' : ''}`;
     messageDiv.id = `message-${messageId}`;
-    
+    chatMessages.appendChild(messageDiv);
+    return messageDiv;
+}
+
+function renderMessage(messageDiv, content, type, sources = null) {
     // Convert markdown to HTML for assistant messages
     const displayContent = type === 'assistant' ? marked.parse(content) : escapeHtml(content);
     
@@ -156,10 +196,7 @@ function addMessage(content, type, sources = null, isWelcome = false) {
     }
     
     messageDiv.innerHTML = html;
-    chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
-    
-    return messageId;
 }
 
 // Helper function to escape HTML for user messages